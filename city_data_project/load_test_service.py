@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Load test for the daylight query service (start it with `python main.py --serve`)
+"""
+import argparse
+import http.client
+import json
+import math
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+from src.config import SERVICE_HOST, SERVICE_PORT, SERVICE_P99_TARGET_MS
+
+CITIES = ["Tokyo", "Delhi", "Shanghai", "London", "Paris", "New York", "Sydney",
+          "Reykjavik", "Murmansk", "Tromsø", "Moscow", "Cairo", "Lagos", "Anchorage"]
+
+_local = threading.local()
+
+
+def get_connection(host, port):
+    """One keep-alive connection per worker thread"""
+    if getattr(_local, 'conn', None) is None:
+        _local.conn = http.client.HTTPConnection(host, port, timeout=30)
+    return _local.conn
+
+
+def random_query(rng, base_date, distinct_dates):
+    """Mix of city, coordinate and short date-range queries"""
+    target = base_date + timedelta(days=rng.randrange(distinct_dates))
+    kind = rng.random()
+    if kind < 0.6:
+        return {'city': rng.choice(CITIES), 'date': target.isoformat()}
+    if kind < 0.9:
+        return {'lat': round(rng.uniform(-60, 70), 2), 'lng': round(rng.uniform(-180, 180), 2),
+                'date': target.isoformat()}
+    return {'city': rng.choice(CITIES), 'start': target.isoformat(),
+            'end': (target + timedelta(days=6)).isoformat()}
+
+
+def send(host, port, method, path, body=None):
+    conn = get_connection(host, port)
+    payload = json.dumps(body).encode('utf-8') if body is not None else None
+    headers = {'Content-Type': 'application/json'} if payload else {}
+    started = time.perf_counter()
+    try:
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        status = response.status
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        _local.conn = None
+        status = 0
+    return (time.perf_counter() - started) * 1000.0, status
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the daylight query service')
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--requests', type=int, default=5000, help='Total requests to send')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client threads')
+    parser.add_argument('--batch-ratio', type=float, default=0.1,
+                        help='Fraction of requests sent as 20-query batches')
+    parser.add_argument('--distinct-dates', type=int, default=30,
+                        help='Number of distinct dates queried (lower means warmer caches)')
+    parser.add_argument('--p99-target', type=float, default=SERVICE_P99_TARGET_MS,
+                        help=f'p99 latency target in ms (default: {SERVICE_P99_TARGET_MS})')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    base_date = date(2024, 6, 1)
+    plan = []
+    for _ in range(args.requests):
+        if rng.random() < args.batch_ratio:
+            plan.append(('POST', '/daylight/batch',
+                         {'queries': [random_query(rng, base_date, args.distinct_dates) for _ in range(20)]}))
+        else:
+            q = random_query(rng, base_date, args.distinct_dates)
+            plan.append(('GET', '/daylight?' + urlencode(q), None))
+
+    print(f"Sending {args.requests} requests to {args.host}:{args.port} with {args.concurrency} workers...")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda req: send(args.host, args.port, *req), plan))
+    elapsed = time.perf_counter() - started
+
+    latencies = [ms for ms, status in results if status == 200]
+    errors = len(results) - len(latencies)
+    if not latencies:
+        print("❌ No successful requests - is the service running?")
+        sys.exit(1)
+
+    p99 = percentile(latencies, 99)
+    print("\n" + "="*60)
+    print("LOAD TEST RESULTS")
+    print("="*60)
+    print(f"   Throughput: {len(results) / elapsed:,.0f} req/s over {elapsed:.1f}s")
+    print(f"   Errors: {errors}")
+    print(f"   p50: {percentile(latencies, 50):.2f} ms")
+    print(f"   p95: {percentile(latencies, 95):.2f} ms")
+    print(f"   p99: {p99:.2f} ms (target {args.p99_target:.0f} ms)")
+    print(f"   max: {max(latencies):.2f} ms")
+
+    if p99 > args.p99_target or errors:
+        print("\n❌ Latency target missed" if p99 > args.p99_target else "\n❌ Requests failed")
+        sys.exit(1)
+    print("\n✅ p99 within target")
+
+
+if __name__ == "__main__":
+    main()
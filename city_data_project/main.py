@@ -4,8 +4,18 @@ Main script to gather city data with sunrise/sunset times and population
 """
 import argparse
 import logging
+import sys
 from datetime import date
 from src.city_processor import CityDataProcessor
+from src.sharding import parse_shard, select_shard, shard_filename, shard_tag, merge_partials, ranking_filename
+from src.batch_jobs import run_jobs
+from src.city_filter import CityFilter
+from src.result_schema import format_for_display
+from src.leaderboard import daily_leaderboard, leaderboard_frame
+from src.daylight_service import run_service
+from src.daylight_raster import generate_daylight_raster
+from src.async_pipeline import process_with_pipeline, sample_city_chunks
+from src.config import SERVICE_HOST, SERVICE_PORT, RASTER_RESOLUTION, PIPELINE_CHUNK_ROWS, PIPELINE_WORKERS
 
 def setup_logging():
     """Setup logging configuration"""
@@ -18,25 +28,90 @@ def setup_logging():
         ]
     )
 
+def check_flag_combinations(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    """Exit with a usage error for flags the selected mode would silently ignore"""
+    modes = {
+        '--serve': args.serve,
+        '--raster': args.raster,
+        '--jobs': args.jobs,
+        '--pipeline': args.pipeline is not None,
+        '--leaderboard': args.leaderboard,
+        '--summer-solstice': args.summer_solstice,
+        'merge': args.command == 'merge',
+    }
+    chosen = [name for name, selected in modes.items() if selected]
+    if len(chosen) > 1:
+        parser.error(f"{chosen[0]} cannot be combined with {chosen[1]}")
+    mode = chosen[0] if chosen else None
+    
+    if args.partials and mode != 'merge':
+        parser.error("shard output files are only taken by the merge command")
+    if args.shard and mode not in (None, '--summer-solstice'):
+        parser.error(f"--shard cannot be used with {mode}")
+    if args.end_date and mode not in (None, '--leaderboard'):
+        parser.error(f"--end-date cannot be used with {mode}")
+    if args.date and mode in ('--serve', '--jobs', '--summer-solstice', 'merge'):
+        parser.error(f"--date cannot be used with {mode}")
+    if args.raster_end and mode != '--raster':
+        parser.error("--raster-end needs --raster")
+
 def main():
     """Main execution function"""
     parser = argparse.ArgumentParser(description='Gather city data with sunrise/sunset times')
+    parser.add_argument('command', nargs='?', choices=['run', 'merge'], default='run',
+                       help="'run' (default) processes cities; 'merge' combines shard outputs")
+    parser.add_argument('partials', nargs='*',
+                       help='Shard output files to combine (merge only)')
     parser.add_argument('--sample-size', type=int, default=10, 
                        help='Number of cities to process (default: 10)')
     parser.add_argument('--no-api', action='store_true', 
                        help='Use local calculation instead of API')
     parser.add_argument('--output', type=str, default='cities_with_sunrise_sunset.csv',
-                       help='Output CSV filename')
+                       help='Output filename: .csv, .csv.gz, .csv.zst or .jsonl, or - for stdout')
     parser.add_argument('--date', type=str, 
                        help='Target date in YYYY-MM-DD format (default: today)')
+    parser.add_argument('--end-date', type=str,
+                       help='Stream every city for each date from --date to this date (YYYY-MM-DD) to --output')
     parser.add_argument('--summer-solstice', action='store_true',
                        help='Analyze summer solstice 2024 (June 20) and rank by daylight')
     parser.add_argument('--min-population', type=int, default=200000,
                        help='Minimum city population (default: 200,000)')
     parser.add_argument('--top-cities', type=int, default=20,
                        help='Number of top cities to return (default: 20)')
+    parser.add_argument('--countries', type=str,
+                       help='Comma-separated country names to load (filtered while loading)')
+    parser.add_argument('--bbox', type=str,
+                       help='Bounding box south,north,west,east in degrees (filtered while loading)')
+    parser.add_argument('--leaderboard', type=int, metavar='K',
+                       help='Write the top K cities by daylight for every date from --date to --end-date')
+    parser.add_argument('--jobs', type=str,
+                       help='Run every analysis in a YAML/JSON job file in one process')
+    parser.add_argument('--shard', type=str,
+                       help='Process only shard i of N (0-based, e.g. 2/16) and write a shard-tagged output')
+    parser.add_argument('--pipeline', nargs='?', const='', metavar='CITIES_CSV',
+                       help='Stream cities (sample cities, or CITIES_CSV / a GeoNames .txt/.zip dump in '
+                            'chunks) through overlapped load/compute/write stages into --output')
+    parser.add_argument('--workers', type=int, default=PIPELINE_WORKERS,
+                       help=f'Concurrent compute workers in --pipeline mode (default: {PIPELINE_WORKERS})')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Recompute the summer solstice ranking even if a cached answer exists')
+    parser.add_argument('--deadline', type=float,
+                       help='Stop calling the API after this many seconds and compute the rest locally')
+    parser.add_argument('--serve', action='store_true',
+                       help='Run the long-lived daylight query service instead of a one-shot analysis')
+    parser.add_argument('--host', type=str, default=SERVICE_HOST,
+                       help=f'Service bind address (default: {SERVICE_HOST})')
+    parser.add_argument('--port', type=int, default=SERVICE_PORT,
+                       help=f'Service port (default: {SERVICE_PORT})')
+    parser.add_argument('--raster', type=str,
+                       help='Write a global daylight-hours raster (.npy) for --date instead of processing cities')
+    parser.add_argument('--raster-end', type=str,
+                       help='Last date (YYYY-MM-DD) of the raster; one layer per day from --date')
+    parser.add_argument('--raster-resolution', type=float, default=RASTER_RESOLUTION,
+                       help=f'Raster cell size in degrees (default: {RASTER_RESOLUTION})')
     
     args = parser.parse_args()
+    check_flag_combinations(parser, args)
     
     # Setup logging
     setup_logging()
@@ -51,11 +126,110 @@ def main():
             logger.error(f"Invalid date format: {args.date}. Use YYYY-MM-DD")
             return
     
+    try:
+        bbox = tuple(float(v) for v in args.bbox.split(',')) if args.bbox else None
+        if bbox and len(bbox) != 4:
+            raise ValueError
+    except ValueError:
+        logger.error(f"Invalid bounding box: {args.bbox}. Use south,north,west,east")
+        return
+    countries = [c.strip() for c in args.countries.split(',')] if args.countries else None
+    city_filter = CityFilter(args.min_population, countries, bbox=bbox)
+    
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            logger.error(str(e))
+            return
+    
+    if args.serve:
+        run_service(args.host, args.port, args.min_population, city_filter)
+        return
+    
+    if args.raster:
+        try:
+            raster_end = date.fromisoformat(args.raster_end) if args.raster_end else target_date
+        except ValueError:
+            logger.error(f"Invalid date format: {args.raster_end}. Use YYYY-MM-DD")
+            return
+        generate_daylight_raster(args.raster, target_date, raster_end, resolution=args.raster_resolution)
+        return
+    
     logger.info("Starting city data processing...")
     
     # Initialize processor
     processor = CityDataProcessor()
     
+    if args.jobs:
+        outputs = run_jobs(args.jobs, processor)
+        for name, path in outputs.items():
+            print(f"{name}: {path or 'failed'}")
+        return
+    
+    end_date = target_date
+    if args.end_date:
+        try:
+            end_date = date.fromisoformat(args.end_date)
+        except ValueError:
+            logger.error(f"Invalid date format: {args.end_date}. Use YYYY-MM-DD")
+            return
+    
+    if args.pipeline is not None:
+        city_filter = city_filter.with_min_population(args.min_population)
+        if args.pipeline.endswith(('.txt', '.zip')):
+            chunks = processor.data_fetcher.iter_geonames_dump(args.pipeline, city_filter=city_filter,
+                                                               chunksize=PIPELINE_CHUNK_ROWS)
+        elif args.pipeline:
+            chunks = processor.data_fetcher.iter_cities_from_csv(args.pipeline, city_filter=city_filter,
+                                                                 chunksize=PIPELINE_CHUNK_ROWS)
+        else:
+            chunks = sample_city_chunks(processor, min_population=args.min_population, city_filter=city_filter)
+        rows = process_with_pipeline(args.output, target_date, use_api=not args.no_api, chunks=chunks,
+                                     processor=processor, workers=args.workers)
+        logger.info(f"Pipeline wrote {rows} rows to {processor.resolve_output_path(args.output)}")
+        return
+    
+    if args.leaderboard:
+        ids, hours = daily_leaderboard(processor.load_sample_cities(args.min_population, city_filter),
+                                       target_date, end_date, args.leaderboard)
+        processor.save_to_csv(leaderboard_frame(ids, hours), args.output)
+        return
+    
+    if args.end_date:
+        cities_df = processor.load_sample_cities(args.min_population, city_filter)
+        if shard:
+            cities_df = select_shard(cities_df, *shard)
+        if args.sample_size:
+            cities_df = cities_df.head(args.sample_size)
+        if shard:
+            cities_df['shard'] = shard_tag(*shard)
+        output = shard_filename(args.output, *shard) if shard and args.output != '-' else args.output
+        rows = processor.write_sunrise_sunset_grid(cities_df, target_date, end_date, output,
+                                                   use_api=not args.no_api)
+        logger.info(f"Streamed {rows} city-date rows to {processor.resolve_output_path(output)}")
+        return
+    
+    if args.command == 'merge':
+        if not args.partials:
+            logger.error("merge needs at least one shard output file")
+            return
+        output_path = processor.resolve_output_path(args.output)
+        top_df = merge_partials(args.partials, output_path, top_n=args.top_cities)
+        # With the merge streamed to stdout, only the summary (on stderr) carries the ranking
+        to_stdout = output_path == '-'
+        top_path = 'not written' if to_stdout else processor.save_to_csv(
+            top_df, ranking_filename(output_path, args.top_cities))
+        
+        summary = sys.stderr if to_stdout else sys.stdout
+        print(f"\nTop {len(top_df)} cities across {len(args.partials)} shards (full merge: {output_path}, "
+              f"ranking: {top_path}):", file=summary)
+        display_cols = [c for c in ['name', 'country', 'population', 'latitude', 'daylight_hours', 'sunrise', 'sunset']
+                        if c in top_df.columns]
+        print(top_df[display_cols].to_string(index=False), file=summary)
+        return
+    
     try:
         if args.summer_solstice:
             # Special summer solstice analysis
@@ -67,10 +241,14 @@ def main():
             cities_df = processor.process_summer_solstice_analysis(
                 min_population=args.min_population,
                 top_cities=args.top_cities,
-                use_api=not args.no_api
+                use_api=not args.no_api,
+                deadline_seconds=args.deadline,
+                shard=shard,
+                city_filter=city_filter,
+                use_cache=not args.no_cache
             )
             
-            output_filename = f"summer_solstice_2024_top_{args.top_cities}_cities.csv"
+            output_filename = '-' if args.output == '-' else f"summer_solstice_2024_top_{args.top_cities}_cities.csv"
             
         else:
             # Regular processing
@@ -82,11 +260,21 @@ def main():
             # Process cities
             cities_df = processor.process_sample_cities(
                 sample_size=args.sample_size,
-                use_api=not args.no_api
+                use_api=not args.no_api,
+                target_date=target_date,
+                min_population=args.min_population,
+                deadline_seconds=args.deadline,
+                shard=shard,
+                city_filter=city_filter
             )
             
             output_filename = args.output
         
+        if shard:
+            cities_df['shard'] = shard_tag(*shard)
+            if output_filename != '-':
+                output_filename = shard_filename(output_filename, *shard)
+        
         if len(cities_df) > 0:
             # Save results
             output_path = processor.save_to_csv(cities_df, output_filename)
@@ -95,15 +283,16 @@ def main():
                 logger.info(f"Successfully processed {len(cities_df)} cities")
                 logger.info(f"Results saved to: {output_path}")
                 
-                # Display sample results
-                print("\n" + "="*100)
-                print("RESULTS SUMMARY")
-                print("="*100)
+                # Display sample results (on stderr when the results themselves went to stdout)
+                summary = sys.stderr if output_path == '-' else sys.stdout
+                print("\n" + "="*100, file=summary)
+                print("RESULTS SUMMARY", file=summary)
+                print("="*100, file=summary)
                 
                 if args.summer_solstice:
                     display_cols = ['name', 'country', 'population', 'latitude', 
                                    'daylight_hours', 'sunrise', 'sunset', 'day_length']
-                    print(f"Top {len(cities_df)} cities with most daylight on Summer Solstice 2024 (June 20):")
+                    print(f"Top {len(cities_df)} cities with most daylight on Summer Solstice 2024 (June 20):", file=summary)
                 else:
                     display_cols = ['name', 'country', 'population', 'latitude', 'longitude', 
                                    'sunrise', 'sunset', 'day_length']
@@ -111,18 +300,18 @@ def main():
                 available_cols = [col for col in display_cols if col in cities_df.columns]
                 
                 # Format for better display
-                display_df = cities_df[available_cols].copy()
+                display_df = format_for_display(cities_df)[available_cols]
                 if 'population' in display_df.columns:
                     display_df['population'] = display_df['population'].apply(lambda x: f"{x:,}")
                 if 'daylight_hours' in display_df.columns:
                     display_df['daylight_hours'] = display_df['daylight_hours'].apply(lambda x: f"{x:.2f}h")
                 
-                print(display_df.to_string(index=True, max_rows=25))
+                print(display_df.to_string(index=True, max_rows=25), file=summary)
                 
                 if args.summer_solstice:
-                    print(f"\n💡 The city with the most daylight was: {cities_df.iloc[0]['name']}, {cities_df.iloc[0]['country']}")
-                    print(f"   Daylight hours: {cities_df.iloc[0]['daylight_hours']:.2f} hours")
-                    print(f"   Population: {cities_df.iloc[0]['population']:,}")
+                    print(f"\n💡 The city with the most daylight was: {cities_df.iloc[0]['name']}, {cities_df.iloc[0]['country']}", file=summary)
+                    print(f"   Daylight hours: {cities_df.iloc[0]['daylight_hours']:.2f} hours", file=summary)
+                    print(f"   Population: {cities_df.iloc[0]['population']:,}", file=summary)
                 
             else:
                 logger.error("Failed to save results")
@@ -3,18 +3,21 @@
 Standalone script to find top 20 NON-EUROPEAN cities with 200k+ population 
 ranked by most daylight on Summer Solstice 2024 (June 20)
 """
+import argparse
 import pandas as pd
 import os
 from datetime import date, datetime
-from astral import LocationInfo
-from astral.sun import sun
 import logging
+from src.city_filter import CityFilter
+from src.timezones import attach_timezones
+from src.result_schema import format_for_display
+from src.region_summary import daylight_durations, add_rank, add_region, summarize_groups
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_non_european_cities():
+def get_non_european_cities(city_filter=None):
     """Load comprehensive NON-European city data with 200k+ population"""
     cities = [
         # NORTH AMERICA - Major cities
@@ -166,65 +169,34 @@ def get_non_european_cities():
         {"name": "Christchurch", "latitude": -43.5321, "longitude": 172.6362, "population": 383200, "country": "New Zealand"},
     ]
     
-    # Filter by minimum population of 200k
-    filtered_cities = [city for city in cities if city['population'] >= 5000]
-    return pd.DataFrame(filtered_cities)
+    # Filter by minimum population (and any other filters) before building the frame
+    city_filter = (city_filter or CityFilter()).with_min_population(5000)
+    return pd.DataFrame(city_filter.select_records(cities))
 
-def calculate_daylight_duration(lat, lng, target_date, city_name=""):
-    """Calculate daylight duration for a given location and date"""
-    try:
-        location = LocationInfo(city_name, "", "", lat, lng)
-        s = sun(location.observer, date=target_date)
-        
-        sunrise = s['sunrise']
-        sunset = s['sunset']
-        
-        # Calculate daylight duration in hours
-        daylight_duration = (sunset - sunrise).total_seconds() / 3600.0
-        
-        return {
-            'sunrise': sunrise.strftime('%H:%M:%S'),
-            'sunset': sunset.strftime('%H:%M:%S'),
-            'daylight_hours': daylight_duration,
-            'day_length': f"{int(daylight_duration)}:{int((daylight_duration % 1) * 60):02d}:{int(((daylight_duration % 1) * 60 % 1) * 60):02d}",
-            'status': 'success'
-        }
-    except Exception as e:
-        error_msg = str(e)
-        logger.warning(f"Error calculating daylight for {city_name}: {error_msg}")
-        
-        # Handle polar day/night situations manually
-        if "never reaches" in error_msg.lower():
-            if lat > 60:  # High northern latitude during summer solstice
-                logger.info(f"Assuming polar day (24h daylight) for {city_name} at {lat:.2f}°N")
-                return {
-                    'sunrise': "00:00:00",
-                    'sunset': "23:59:59", 
-                    'daylight_hours': 24.0,
-                    'day_length': "24:00:00",
-                    'status': 'polar_day'
-                }
-            elif lat < -60:  # High southern latitude during summer solstice (their winter)
-                logger.info(f"Assuming polar night (0h daylight) for {city_name} at {lat:.2f}°S")
-                return {
-                    'sunrise': "12:00:00",
-                    'sunset': "12:00:00",
-                    'daylight_hours': 0.0,
-                    'day_length': "0:00:00",
-                    'status': 'polar_night'
-                }
-        
-        # For other errors, return zero
-        return {
-            'sunrise': None,
-            'sunset': None,
-            'daylight_hours': 0.0,
-            'day_length': "0:00:00",
-            'status': f'error: {error_msg}'
-        }
+# Continent of every country in the list above, for the regional breakdown
+REGIONS = {
+    'North America': ['Canada', 'United States', 'Mexico'],
+    'South America': ['Argentina', 'Bolivia', 'Brazil', 'Chile', 'Colombia', 'Ecuador', 'Peru', 'Uruguay', 'Venezuela'],
+    'Asia': ['Bangladesh', 'China', 'Hong Kong', 'India', 'Indonesia', 'Iran', 'Iraq', 'Israel', 'Japan', 'Malaysia',
+             'Pakistan', 'Philippines', 'Saudi Arabia', 'Singapore', 'South Korea', 'Taiwan', 'Thailand', 'UAE', 'Vietnam'],
+    'Africa': ['Algeria', 'Angola', 'DR Congo', 'Egypt', 'Ethiopia', 'Ghana', 'Kenya', 'Morocco', 'Nigeria', 'Senegal',
+               'South Africa', 'Tanzania', 'Tunisia'],
+    'Oceania': ['Australia', 'New Zealand'],
+}
+
+# Columns of the results table
+OUTPUT_COLUMNS = ['name', 'country', 'latitude', 'longitude', 'population', 'timezone',
+                  'sunrise', 'sunset', 'daylight_hours', 'day_length', 'status']
 
 def main():
     """Main analysis function"""
+    parser = argparse.ArgumentParser(description="Non-European cities ranked by daylight on summer solstice 2024")
+    parser.add_argument('--min-population', type=int, default=0,
+                        help='Only include cities with at least this population (filtered before the frame is built)')
+    parser.add_argument('--countries', type=str,
+                        help='Comma-separated country names to include')
+    args = parser.parse_args()
+    
     # Summer solstice 2024 date
     solstice_date = date(2024, 6, 20)
     
@@ -233,62 +205,45 @@ def main():
     logger.info("Minimum population: 200,000")
     
     # Load city data
-    cities_df = get_non_european_cities()
+    countries = [c.strip() for c in args.countries.split(',')] if args.countries else None
+    city_filter = CityFilter(args.min_population, countries)
+    cities_df = get_non_european_cities(city_filter)
     logger.info(f"Loaded {len(cities_df)} non-European cities with 200k+ population")
     
-    # Calculate daylight for each city
-    logger.info("Calculating daylight duration for each city...")
+    # Attach IANA timezones so each city is computed for its local date
+    cities_df = attach_timezones(cities_df)
     
-    daylight_data = []
-    for idx, row in cities_df.iterrows():
-        city_name = row['name']
-        country = row['country']
-        lat = row['latitude']
-        lng = row['longitude']
-        population = row['population']
-        
-        logger.info(f"Processing {city_name}, {country} ({idx + 1}/{len(cities_df)})")
-        
-        daylight_info = calculate_daylight_duration(lat, lng, solstice_date, city_name)
-        
-        daylight_data.append({
-            'name': city_name,
-            'country': country,
-            'latitude': lat,
-            'longitude': lng,
-            'population': population,
-            'sunrise': daylight_info['sunrise'],
-            'sunset': daylight_info['sunset'],
-            'daylight_hours': daylight_info['daylight_hours'],
-            'day_length': daylight_info['day_length'],
-            'status': daylight_info.get('status', 'unknown')
-        })
-    
-    # Create results dataframe
-    results_df = pd.DataFrame(daylight_data)
+    # Calculate daylight for every city in one vectorized pass: UTC sunrise/sunset,
+    # day length in seconds
+    logger.info("Calculating daylight duration for each city...")
+    results_df = daylight_durations(cities_df, solstice_date)[OUTPUT_COLUMNS]
     
     # Sort by daylight hours (descending) and then by population for ties
     results_df = results_df.sort_values(['daylight_hours', 'population'], ascending=[False, False])
     
+    # Rank, region and one grouped pass per grouping for the reports below
+    results_df = add_region(add_rank(results_df), REGIONS, other='Other')
+    by_country = summarize_groups(results_df, 'country', top_k=10)
+    canadian = by_country.get('Canada')
+    
     # Show some debugging info
     print(f"\n🔍 DEBUGGING INFO:")
-    print(f"Cities with 0 daylight hours: {len(results_df[results_df['daylight_hours'] == 0.0])}")
-    print(f"Cities with 24 daylight hours: {len(results_df[results_df['daylight_hours'] == 24.0])}")
-    print(f"Canadian cities in dataset: {len(results_df[results_df['country'] == 'Canada'])}")
+    print(f"Cities with 0 daylight hours: {int((results_df['daylight_hours'] == 0.0).sum())}")
+    print(f"Cities with 24 daylight hours: {int((results_df['daylight_hours'] == 24.0).sum())}")
+    print(f"Canadian cities in dataset: {canadian.count if canadian else 0}")
     
     # Show top Canadian cities specifically
-    canadian_cities = results_df[results_df['country'] == 'Canada'].head(10)
-    if len(canadian_cities) > 0:
+    if canadian:
         print(f"\n🍁 TOP CANADIAN CITIES:")
-        for idx, row in canadian_cities.iterrows():
-            print(f"   {row['name']}: {row['daylight_hours']:.2f}h (lat: {row['latitude']:.2f}°N)")
+        for row in canadian.top.itertuples():
+            print(f"   {row.name}: {row.daylight_hours:.2f}h (lat: {row.latitude:.2f}°N)")
     
     # Get top 50 cities
     top_50 = results_df.head(50)
     
-    # Save to CSV
+    # Save to CSV as local clock times and H:MM:SS day lengths
     output_file = f"non_european_summer_solstice_2024_top_50_cities_by_daylight.csv"
-    top_50.to_csv(output_file, index=False)
+    format_for_display(top_50).to_csv(output_file, index=False)
     
     # Display results
     print("\n" + "="*120)
@@ -307,8 +262,9 @@ def main():
     
     print(f"\n🌞 WINNER: {top_50.iloc[0]['name']}, {top_50.iloc[0]['country']}")
     print(f"   Daylight: {top_50.iloc[0]['daylight_hours']:.2f} hours")
-    print(f"   Sunrise: {top_50.iloc[0]['sunrise']}")
-    print(f"   Sunset: {top_50.iloc[0]['sunset']}")
+    winner = format_for_display(top_50.head(1), '%H:%M:%S').iloc[0]
+    print(f"   Sunrise: {winner['sunrise']}")
+    print(f"   Sunset: {winner['sunset']}")
     print(f"   Population: {top_50.iloc[0]['population']:,}")
     print(f"   Latitude: {top_50.iloc[0]['latitude']:.2f}°{'N' if top_50.iloc[0]['latitude'] >= 0 else 'S'}")
     print(f"   Status: {top_50.iloc[0]['status']}")
@@ -325,25 +281,28 @@ def main():
     
     # Show regional breakdown
     print(f"\n🌎 REGIONAL BREAKDOWN (Top 50):")
-    region_counts = top_50['country'].value_counts()
-    for country, count in region_counts.head(8).items():
-        print(f"   {country}: {count} cities")
+    for summary in summarize_groups(top_50, 'region', top_k=1).values():
+        best = summary.top.iloc[0]
+        print(f"   {summary.name}: {summary.count} cities (best #{best['rank']} {best['name']})")
+    
+    top_50_groups = summarize_groups(top_50, 'country', top_k=None)
+    print(f"   By country:")
+    for summary in sorted(top_50_groups.values(), key=lambda g: -g.count)[:8]:
+        print(f"     {summary.name}: {summary.count} cities")
     
     # Show the Canadian cities specifically
-    top_canadian = top_50[top_50['country'] == 'Canada']
-    if len(top_canadian) > 0:
+    top_canadian = top_50_groups.get('Canada')
+    if top_canadian:
         print(f"\n🍁 CANADIAN CITIES IN TOP 50:")
-        for idx, row in top_canadian.iterrows():
-            rank = top_50.index.get_loc(idx) + 1
-            print(f"   #{rank}: {row['name']} - {row['daylight_hours']:.2f}h (lat: {row['latitude']:.2f}°N)")
+        for row in top_canadian.top.itertuples():
+            print(f"   #{row.rank}: {row.name} - {row.daylight_hours:.2f}h (lat: {row.latitude:.2f}°N)")
     
     # Show any polar day cities
-    polar_cities = top_50[top_50['status'] == 'polar_day']
-    if len(polar_cities) > 0:
+    polar = summarize_groups(top_50, 'status', top_k=None).get('polar_day')
+    if polar:
         print(f"\n☀️ POLAR DAY CITIES (24h daylight):")
-        for idx, row in polar_cities.iterrows():
-            rank = top_50.index.get_loc(idx) + 1
-            print(f"   #{rank}: {row['name']}, {row['country']} (lat: {row['latitude']:.2f}°N)")
+        for row in polar.top.itertuples():
+            print(f"   #{row.rank}: {row.name}, {row.country} (lat: {row.latitude:.2f}°N)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
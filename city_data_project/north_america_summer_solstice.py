@@ -2,17 +2,21 @@
 """
 North American cities ranked by daylight on Summer Solstice 2024 (June 20)
 """
+import argparse
 import pandas as pd
 from datetime import date
-from astral import LocationInfo
-from astral.sun import sun
 import logging
+from src.incremental import attach_input_hash, reuse_previous
+from src.city_filter import CityFilter
+from src.timezones import attach_timezones
+from src.result_schema import format_for_display
+from src.region_summary import daylight_durations
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_north_american_cities():
+def get_north_american_cities(city_filter=None):
     """Load comprehensive North American city data"""
     cities = [
         # CANADA - Major cities + northern settlements
@@ -106,54 +110,27 @@ def get_north_american_cities():
         {"name": "Acapulco", "latitude": 16.8531, "longitude": -99.8237, "population": 779000, "country": "Mexico"},
     ]
     
+    
+    # Drop filtered cities before building the frame
+    if city_filter is not None:
+        cities = city_filter.select_records(cities)
     return pd.DataFrame(cities)
 
-def calculate_daylight_duration(lat, lng, target_date, city_name=""):
-    """Calculate daylight duration for a given location and date"""
-    try:
-        location = LocationInfo(city_name, "", "", lat, lng)
-        s = sun(location.observer, date=target_date)
-        
-        sunrise = s['sunrise']
-        sunset = s['sunset']
-        
-        # Calculate daylight duration in hours
-        daylight_duration = (sunset - sunrise).total_seconds() / 3600.0
-        
-        return {
-            'sunrise': sunrise.strftime('%H:%M:%S'),
-            'sunset': sunset.strftime('%H:%M:%S'),
-            'daylight_hours': daylight_duration,
-            'day_length': f"{int(daylight_duration)}:{int((daylight_duration % 1) * 60):02d}:{int(((daylight_duration % 1) * 60 % 1) * 60):02d}",
-            'status': 'success'
-        }
-    except Exception as e:
-        error_msg = str(e)
-        logger.warning(f"Error calculating daylight for {city_name}: {error_msg}")
-        
-        # Handle polar day/night situations manually
-        if "never reaches" in error_msg.lower():
-            if lat > 60:  # High northern latitude during summer solstice
-                logger.info(f"Assuming polar day (24h daylight) for {city_name} at {lat:.2f}°N")
-                return {
-                    'sunrise': "00:00:00",
-                    'sunset': "23:59:59", 
-                    'daylight_hours': 24.0,
-                    'day_length': "24:00:00",
-                    'status': 'polar_day'
-                }
-        
-        # For other errors, return zero
-        return {
-            'sunrise': None,
-            'sunset': None,
-            'daylight_hours': 0.0,
-            'day_length': "0:00:00",
-            'status': f'error: {error_msg}'
-        }
+# Columns computed per city; everything else is copied from the input
+RESULT_COLUMNS = ['sunrise', 'sunset', 'daylight_hours', 'day_length', 'status']
+OUTPUT_COLUMNS = ['name', 'country', 'latitude', 'longitude', 'population', 'timezone'] + RESULT_COLUMNS + ['input_hash']
 
 def main():
     """Main analysis function"""
+    parser = argparse.ArgumentParser(description="North American cities ranked by daylight on summer solstice 2024")
+    parser.add_argument('--incremental', action='store_true',
+                        help='Reuse unchanged rows from the previous output and compute only new or changed cities')
+    parser.add_argument('--min-population', type=int, default=0,
+                        help='Only include cities with at least this population (filtered before the frame is built)')
+    parser.add_argument('--countries', type=str,
+                        help='Comma-separated country names to include')
+    args = parser.parse_args()
+    
     # Summer solstice 2024 date
     solstice_date = date(2024, 6, 20)
     
@@ -161,53 +138,43 @@ def main():
     logger.info(f"Analyzing North American cities for {solstice_date}")
     
     # Load city data
-    cities_df = get_north_american_cities()
+    countries = [c.strip() for c in args.countries.split(',')] if args.countries else None
+    city_filter = CityFilter(args.min_population, countries)
+    cities_df = get_north_american_cities(city_filter)
     logger.info(f"Loaded {len(cities_df)} North American cities")
     
-    # Calculate daylight for each city
-    logger.info("Calculating daylight duration for each city...")
+    # Attach IANA timezones so each city is computed for its local date
+    cities_df = attach_timezones(cities_df)
     
-    daylight_data = []
-    for idx, row in cities_df.iterrows():
-        city_name = row['name']
-        country = row['country']
-        lat = row['latitude']
-        lng = row['longitude']
-        population = row['population']
-        
-        logger.info(f"Processing {city_name}, {country} ({idx + 1}/{len(cities_df)})")
-        
-        daylight_info = calculate_daylight_duration(lat, lng, solstice_date, city_name)
-        
-        daylight_data.append({
-            'name': city_name,
-            'country': country,
-            'latitude': lat,
-            'longitude': lng,
-            'population': population,
-            'sunrise': daylight_info['sunrise'],
-            'sunset': daylight_info['sunset'],
-            'daylight_hours': daylight_info['daylight_hours'],
-            'day_length': daylight_info['day_length'],
-            'status': daylight_info.get('status', 'unknown')
-        })
-    
-    # Create results dataframe
-    results_df = pd.DataFrame(daylight_data)
+    # Hash inputs so later runs can reuse rows that did not change
+    cities_df = attach_input_hash(cities_df, solstice_date)
+    output_file = "north_america_summer_solstice_2024_all_cities.csv"
+    reused_df, todo_df = cities_df.iloc[:0], cities_df
+    if args.incremental:
+        reused_df, todo_df = reuse_previous(cities_df, output_file, RESULT_COLUMNS)
+    
+    # Calculate daylight for every new or changed city in one vectorized pass:
+    # UTC sunrise/sunset, day length in seconds
+    logger.info(f"Calculating daylight duration for {len(todo_df)} cities...")
+    results_df = daylight_durations(todo_df, solstice_date)[OUTPUT_COLUMNS].reset_index(drop=True)
+    
+    # Re-rank over the merged set: reused rows plus freshly computed ones
+    if len(reused_df) > 0:
+        frames = [reused_df[OUTPUT_COLUMNS]] + ([results_df] if len(results_df) > 0 else [])
+        results_df = pd.concat(frames, ignore_index=True)
     
     # Sort by daylight hours (descending) and then by population for ties
     results_df = results_df.sort_values(['daylight_hours', 'population'], ascending=[False, False])
     
-    # Save to CSV
-    output_file = f"north_america_summer_solstice_2024_all_cities.csv"
-    results_df.to_csv(output_file, index=False)
+    # Save to CSV as local clock times and H:MM:SS day lengths
+    format_for_display(results_df).to_csv(output_file, index=False)
     
     # Display results
     print("\n" + "="*130)
     print("NORTH AMERICAN CITIES RANKED BY DAYLIGHT ON SUMMER SOLSTICE 2024 (June 20)")
     print("="*130)
     
-    display_df = results_df[['name', 'country', 'population', 'latitude', 'daylight_hours', 'sunrise', 'sunset', 'status']].copy()
+    display_df = format_for_display(results_df, '%H:%M:%S')[['name', 'country', 'population', 'latitude', 'daylight_hours', 'sunrise', 'sunset', 'status']]
     display_df['population'] = display_df['population'].apply(lambda x: f"{x:,}")
     display_df['daylight_hours'] = display_df['daylight_hours'].apply(lambda x: f"{x:.2f}h")
     display_df['latitude'] = display_df['latitude'].apply(lambda x: f"{x:.2f}°N")
@@ -0,0 +1,135 @@
+"""
+Staged asyncio pipeline: chunked loading, sun computation and streaming output run
+concurrently, connected by bounded queues so memory stays flat while the stages overlap
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, Iterable, Optional
+import pandas as pd
+from .city_processor import CityDataProcessor
+from .config import PIPELINE_CHUNK_ROWS, PIPELINE_QUEUE_SIZE, PIPELINE_WORKERS
+from .output_writer import StreamingWriter
+from .result_schema import format_for_display
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class StageTimer:
+    """
+    Busy seconds per stage, to compare against the pipeline's wall time
+    """
+
+    def __init__(self):
+        self.busy: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        self.busy[stage] = self.busy.get(stage, 0.0) + seconds
+
+    def summary(self, wall: float) -> str:
+        stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in self.busy.items())
+        return f"wall {wall:.2f}s ({stages})"
+
+
+async def _in_executor(executor, timer: StageTimer, stage: str, func, *args):
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        timer.add(stage, time.perf_counter() - started)
+
+
+async def run_pipeline(chunks: Iterable[pd.DataFrame], output_path: str,
+                       target_date: Optional[date] = None, use_api: bool = False,
+                       processor: Optional[CityDataProcessor] = None,
+                       workers: int = PIPELINE_WORKERS, queue_size: int = PIPELINE_QUEUE_SIZE) -> int:
+    """
+    Stream city chunks through loader -> compute -> writer and return the rows written.
+
+    Loading and writing each run on their own thread; computation runs on a pool of
+    workers threads (concurrent API calls, or vectorized local batches that release
+    the GIL in numpy). Full queues pause the upstream stage, so at most about
+    2 * queue_size + workers chunks are in memory. With several workers, chunks are
+    written in completion order.
+    """
+    processor = processor or CityDataProcessor()
+    target_date = target_date or date.today()
+    compute_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    timer = StageTimer()
+    loader_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline-load')
+    compute_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pipeline-compute')
+    writer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pipeline-write')
+    iterator = iter(chunks)
+
+    async def load():
+        while True:
+            chunk = await _in_executor(loader_pool, timer, 'load', next, iterator, _DONE)
+            if chunk is _DONE:
+                break
+            await compute_queue.put(chunk)
+        for _ in range(workers):
+            await compute_queue.put(_DONE)
+
+    async def compute():
+        while True:
+            chunk = await compute_queue.get()
+            if chunk is _DONE:
+                break
+            result = await _in_executor(compute_pool, timer, 'compute', processor.add_sunrise_sunset_data,
+                                        chunk.copy(), target_date, use_api)
+            await write_queue.put(result)
+        await write_queue.put(_DONE)
+
+    async def write(writer: StreamingWriter):
+        finished = 0
+        while finished < workers:
+            result = await write_queue.get()
+            if result is _DONE:
+                finished += 1
+                continue
+            await _in_executor(writer_pool, timer, 'write', lambda df: writer.write(format_for_display(df)), result)
+
+    started = time.perf_counter()
+    tasks = []
+    try:
+        with StreamingWriter(output_path) as writer:
+            tasks = [asyncio.ensure_future(load()), asyncio.ensure_future(write(writer))]
+            tasks += [asyncio.ensure_future(compute()) for _ in range(workers)]
+            await asyncio.gather(*tasks)
+            rows = writer.rows_written
+    finally:
+        for task in tasks:
+            task.cancel()
+        for pool in (loader_pool, compute_pool, writer_pool):
+            pool.shutdown(wait=False)
+
+    logger.info(f"Pipeline wrote {rows} rows to {output_path}: {timer.summary(time.perf_counter() - started)}")
+    return rows
+
+
+def sample_city_chunks(processor: CityDataProcessor, chunk_rows: int = PIPELINE_CHUNK_ROWS, **load_kwargs) -> Iterable[pd.DataFrame]:
+    """
+    The built-in sample cities as pipeline chunks
+    """
+    cities_df = processor.load_sample_cities(**load_kwargs)
+    for begin in range(0, len(cities_df), chunk_rows):
+        yield cities_df.iloc[begin:begin + chunk_rows]
+
+
+def process_with_pipeline(output_path: str, target_date: Optional[date] = None, use_api: bool = False,
+                          chunks: Optional[Iterable[pd.DataFrame]] = None,
+                          processor: Optional[CityDataProcessor] = None,
+                          workers: int = PIPELINE_WORKERS, queue_size: int = PIPELINE_QUEUE_SIZE) -> int:
+    """
+    Synchronous entry point for scripts
+    """
+    processor = processor or CityDataProcessor()
+    if chunks is None:
+        chunks = sample_city_chunks(processor)
+    return asyncio.run(run_pipeline(chunks, processor.resolve_output_path(output_path), target_date, use_api,
+                                    processor, workers, queue_size))
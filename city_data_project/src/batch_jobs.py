@@ -0,0 +1,122 @@
+"""
+Run many analyses from one job file: cities are loaded once and every (city, date)
+computation shared by several jobs is done once
+"""
+import json
+import logging
+from datetime import date
+from typing import Dict, List, Tuple
+import pandas as pd
+from .city_processor import CityDataProcessor
+from .city_filter import CityFilter
+
+logger = logging.getLogger(__name__)
+
+JOB_KEYS = {'name', 'date', 'min_population', 'top_cities', 'countries', 'use_api', 'output'}
+
+
+def load_job_file(path: str) -> Dict:
+    """
+    Read a YAML or JSON job file: either a list of jobs or {'defaults': {...}, 'jobs': [...]}
+    with optional top-level 'cities_csv'
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("PyYAML is required for YAML job files (pip install pyyaml); use JSON otherwise")
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    if isinstance(spec, list):
+        spec = {'jobs': spec}
+    if not spec or not spec.get('jobs'):
+        raise ValueError(f"No jobs found in {path}")
+    return spec
+
+
+def normalize_jobs(spec: Dict) -> List[Dict]:
+    """
+    Apply defaults, parse dates and give every job a name and output file.
+    Job names and output files must be unique, so defaults cannot set them.
+    """
+    defaults = spec.get('defaults', {})
+    shared = sorted({'name', 'output'} & set(defaults))
+    if shared:
+        raise ValueError(f"defaults cannot set {shared}: every job needs its own")
+    jobs = []
+    for i, raw in enumerate(spec['jobs'], start=1):
+        job = {'min_population': 200000, 'top_cities': None, 'countries': None, 'use_api': False,
+               **defaults, **raw}
+        unknown = set(job) - JOB_KEYS
+        if unknown:
+            logger.warning(f"Ignoring unknown keys in job {i}: {sorted(unknown)}")
+        if isinstance(job['countries'], str):
+            job['countries'] = [job['countries']]
+        job['date'] = date.fromisoformat(str(job.get('date') or date.today()))
+        job.setdefault('name', f"job_{i}")
+        job.setdefault('output', f"{job['name']}.csv")
+        jobs.append(job)
+
+    for key in ('name', 'output'):
+        seen = set()
+        for job in jobs:
+            if job[key] in seen:
+                raise ValueError(f"Duplicate job {key}: {job[key]!r}")
+            seen.add(job[key])
+    return jobs
+
+
+def _select_cities(cities_df: pd.DataFrame, job: Dict) -> pd.Index:
+    return cities_df.index[CityFilter(job['min_population'], job['countries']).mask(cities_df)]
+
+
+def run_jobs(path: str, processor: CityDataProcessor = None) -> Dict[str, str]:
+    """
+    Execute every job in the file and return {job name: output path}
+    """
+    processor = processor or CityDataProcessor()
+    spec = load_job_file(path)
+    jobs = normalize_jobs(spec)
+
+    # Load cities once, pushing down the loosest filter that still covers every job
+    lowest = min(job['min_population'] for job in jobs)
+    countries = None
+    if all(job['countries'] for job in jobs):
+        countries = set().union(*(job['countries'] for job in jobs))
+    city_filter = CityFilter(lowest, countries)
+    if spec.get('cities_csv'):
+        cities_df = processor.data_fetcher.load_cities_from_csv(spec['cities_csv'], city_filter=city_filter)
+    else:
+        cities_df = processor.load_sample_cities(lowest, city_filter)
+    cities_df = cities_df.reset_index(drop=True)
+
+    # Union of the cities each (date, source) pair needs across all jobs
+    selections = {job['name']: _select_cities(cities_df, job) for job in jobs}
+    needed: Dict[Tuple[date, bool], pd.Index] = {}
+    for job in jobs:
+        key = (job['date'], bool(job['use_api']))
+        needed[key] = needed.get(key, pd.Index([])).union(selections[job['name']])
+
+    requested = sum(len(selections[job['name']]) for job in jobs)
+    unique = sum(len(index) for index in needed.values())
+    logger.info(f"{len(jobs)} jobs need {requested} city-date computations, {unique} unique")
+
+    computed = {}
+    for (target_date, use_api), index in needed.items():
+        computed[(target_date, use_api)] = processor.add_sunrise_sunset_data(
+            cities_df.loc[index].copy(), target_date, use_api
+        )
+
+    outputs = {}
+    for job in jobs:
+        enriched = computed[(job['date'], bool(job['use_api']))]
+        result = enriched.loc[selections[job['name']]].copy()
+        if job['top_cities']:
+            result = processor.rank_cities_by_daylight(result, job['top_cities'])
+        output_path = processor.save_to_csv(result, job['output'])
+        outputs[job['name']] = output_path
+        logger.info(f"Job {job['name']}: {len(result)} rows -> {output_path or 'FAILED'}")
+    return outputs
@@ -0,0 +1,101 @@
+"""
+Circuit breaker and run deadline for the sunrise-sunset API path
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+from .config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_SLOW_CALL_SECONDS, CIRCUIT_RESET_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Trips after consecutive failures (slow calls count as failures). While open every call
+    is refused so callers go straight to their fallback; after reset_timeout a single probe
+    is let through (half-open) and closes the circuit again if it succeeds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str = 'api', failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 slow_call_seconds: float = CIRCUIT_SLOW_CALL_SECONDS,
+                 reset_timeout: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.stats = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'trips': 0}
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """
+        Whether the protected call may be attempted now
+        """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                logger.info(f"Circuit '{self.name}' half-open, probing")
+            if self.state == self.CLOSED or (self.state == self.HALF_OPEN and not self.probe_in_flight):
+                self.probe_in_flight = self.state == self.HALF_OPEN
+                self.stats['calls'] += 1
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record_success(self, elapsed: float = 0.0):
+        """
+        Report a completed call; calls slower than slow_call_seconds count as failures
+        """
+        if elapsed > self.slow_call_seconds:
+            self.stats['slow_calls'] += 1
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed after successful probe")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.stats['failures'] += 1
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.stats['trips'] += 1
+                    logger.warning(f"Circuit '{self.name}' open after {self.consecutive_failures} "
+                                   f"consecutive failures; using fallback for {self.reset_timeout:.0f}s")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def summary(self) -> Dict:
+        return {'state': self.state, 'consecutive_failures': self.consecutive_failures, **self.stats}
+
+
+class Deadline:
+    """
+    Optional wall-clock budget for a run; without seconds it never expires
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.started = time.monotonic()
+
+    def expired(self) -> bool:
+        return self.seconds is not None and time.monotonic() - self.started >= self.seconds
+
+    def remaining(self) -> Optional[float]:
+        if self.seconds is None:
+            return None
+        return max(0.0, self.seconds - (time.monotonic() - self.started))
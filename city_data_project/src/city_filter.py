@@ -0,0 +1,127 @@
+"""
+City filters that loaders apply while reading, so excluded rows are never materialized
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class CityFilter:
+    """
+    Minimum population, country set, latitude band and bounding box.
+    bbox is (south, north, west, east); west > east means it crosses the antimeridian.
+    """
+
+    def __init__(self, min_population: int = 0, countries: Optional[Iterable[str]] = None,
+                 lat_range: Optional[Tuple[float, float]] = None,
+                 bbox: Optional[Tuple[float, float, float, float]] = None):
+        self.min_population = min_population or 0
+        self.countries = set(countries) if countries else None
+        self.lat_range = lat_range
+        self.bbox = bbox
+
+    def with_min_population(self, min_population: int) -> 'CityFilter':
+        """
+        Copy with the stricter of the two population thresholds
+        """
+        return CityFilter(max(self.min_population, min_population or 0), self.countries,
+                          self.lat_range, self.bbox)
+
+    def cache_key(self) -> str:
+        """
+        Stable text form of the filter, for keying cached results
+        """
+        countries = ','.join(sorted(self.countries)) if self.countries else ''
+        return f"pop>={self.min_population};countries={countries};lat={self.lat_range};bbox={self.bbox}"
+
+    def is_empty(self) -> bool:
+        return not (self.min_population or self.countries or self.lat_range or self.bbox)
+
+    def _latitude_bounds(self) -> Tuple[float, float]:
+        south, north = -90.0, 90.0
+        if self.lat_range:
+            south, north = max(south, self.lat_range[0]), min(north, self.lat_range[1])
+        if self.bbox:
+            south, north = max(south, self.bbox[0]), min(north, self.bbox[1])
+        return south, north
+
+    def _country_column(self, columns: Iterable[str]) -> str:
+        """
+        Standardized country column to filter on; a country filter without one is an error
+        """
+        for name in ('country', 'country_name'):
+            if name in columns:
+                return name
+        raise ValueError(f"Cannot filter by countries {sorted(self.countries)}: "
+                         f"the data has no 'country' or 'country_name' column")
+
+    def matches(self, city: Dict) -> bool:
+        """
+        Check one record (used on literal city lists before any DataFrame exists)
+        """
+        if self.min_population and (city.get('population') or 0) < self.min_population:
+            return False
+        if self.countries is not None and city.get('country', city.get('country_name')) not in self.countries:
+            return False
+        south, north = self._latitude_bounds()
+        if not south <= city['latitude'] <= north:
+            return False
+        if self.bbox:
+            west, east = self.bbox[2], self.bbox[3]
+            lng = city['longitude']
+            inside = west <= lng <= east if west <= east else (lng >= west or lng <= east)
+            if not inside:
+                return False
+        return True
+
+    def select_records(self, cities: Iterable[Dict]) -> List[Dict]:
+        return [city for city in cities if self.matches(city)]
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Vectorized filter over a (chunk of a) standardized city frame
+        """
+        keep = pd.Series(True, index=df.index)
+        if self.min_population and 'population' in df.columns:
+            keep &= df['population'] >= self.min_population
+        if self.countries is not None:
+            keep &= df[self._country_column(df.columns)].isin(self.countries)
+        south, north = self._latitude_bounds()
+        if (south, north) != (-90.0, 90.0):
+            keep &= df['latitude'].between(south, north)
+        if self.bbox:
+            west, east = self.bbox[2], self.bbox[3]
+            lng = df['longitude']
+            keep &= lng.between(west, east) if west <= east else ((lng >= west) | (lng <= east))
+        return keep
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        return df if self.is_empty() else df[self.mask(df)]
+
+    def arrow_expression(self, columns: Dict[str, str]):
+        """
+        pyarrow.dataset filter expression; columns maps standardized names to the
+        file's own column names. Returns None when there is nothing to filter.
+        """
+        import pyarrow.dataset as ds
+
+        expression = None
+
+        def add(term):
+            nonlocal expression
+            expression = term if expression is None else expression & term
+
+        if self.min_population and 'population' in columns:
+            add(ds.field(columns['population']) >= self.min_population)
+        if self.countries is not None:
+            add(ds.field(columns[self._country_column(columns)]).isin(sorted(self.countries)))
+        south, north = self._latitude_bounds()
+        if (south, north) != (-90.0, 90.0):
+            add((ds.field(columns['latitude']) >= south) & (ds.field(columns['latitude']) <= north))
+        if self.bbox:
+            west, east = self.bbox[2], self.bbox[3]
+            lng = ds.field(columns['longitude'])
+            add(((lng >= west) & (lng <= east)) if west <= east else ((lng >= west) | (lng <= east)))
+        return expression
@@ -3,11 +3,19 @@ Main city data processing pipeline
 """
 import pandas as pd
 import logging
-from datetime import date
-from typing import Optional
+from datetime import date, timedelta
+from typing import Iterable, Optional, Tuple
 from .data_fetcher import CityDataFetcher
 from .sunrise_calculator import SunriseSunsetCalculator
-from .config import MIN_POPULATION, OUTPUT_CSV, DATA_DIR
+from .config import MIN_POPULATION, OUTPUT_CSV, DATA_DIR, SOLAR_CHUNK_CITIES
+from .timezones import attach_timezones
+from .result_schema import (add_result_columns, daylight_hours, day_length_seconds, typed_record,
+                            format_for_display)
+from .sharding import select_shard
+from .output_writer import StreamingWriter
+from .city_filter import CityFilter
+from .latitude_index import LatitudeIndex
+from .ranking_cache import RankingCache, dataset_version
 import os
 
 logger = logging.getLogger(__name__)
@@ -16,13 +24,16 @@ class CityDataProcessor:
     def __init__(self):
         self.data_fetcher = CityDataFetcher()
         self.sunrise_calculator = SunriseSunsetCalculator()
+        self.ranking_cache = RankingCache()
         
         # Ensure data directory exists
         os.makedirs(DATA_DIR, exist_ok=True)
     
-    def load_sample_cities(self, min_population: int = 200000) -> pd.DataFrame:
+    def load_sample_cities(self, min_population: int = 200000,
+                           city_filter: Optional[CityFilter] = None) -> pd.DataFrame:
         """
-        Create a comprehensive dataset of major world cities with 200k+ population
+        Create a comprehensive dataset of major world cities with 200k+ population.
+        Filters are applied to the records before the DataFrame is built.
         """
         sample_cities = [
             # Major world cities with populations over 200k
@@ -79,17 +90,23 @@ class CityDataProcessor:
             {"name": "Tallinn", "latitude": 59.4370, "longitude": 24.7536, "population": 437000, "country": "Estonia"},
         ]
         
-        df = pd.DataFrame(sample_cities)
-        # Filter by minimum population
-        df = df[df['population'] >= min_population]
-        return df
+        # Filter by minimum population (and any other filters) before building the frame
+        city_filter = (city_filter or CityFilter()).with_min_population(min_population)
+        return pd.DataFrame(city_filter.select_records(sample_cities),
+                            columns=['name', 'latitude', 'longitude', 'population', 'country'])
     
     def add_sunrise_sunset_data(self, cities_df: pd.DataFrame, 
                                target_date: Optional[date] = None,
                                use_api: bool = True,
-                               sample_size: Optional[int] = None) -> pd.DataFrame:
+                               sample_size: Optional[int] = None,
+                               extra_elevations: Iterable[float] = (),
+                               deadline_seconds: Optional[float] = None) -> pd.DataFrame:
         """
-        Add sunrise/sunset data to cities dataframe
+        Add sunrise/sunset data to cities dataframe as typed columns: event times are
+        UTC timestamps and day_length is seconds (see result_schema). Local runs compute
+        every city, twilight and any extra elevation angles in one batch.
+        API runs stop calling the API once deadline_seconds have passed and compute the
+        remaining cities locally in one batch.
         """
         if sample_size:
             cities_df = cities_df.head(sample_size)
@@ -99,88 +116,134 @@ class CityDataProcessor:
         
         logger.info(f"Processing {len(cities_df)} cities for date {target_date}")
         
-        # Initialize new columns
-        sunrise_data_columns = [
-            'sunrise', 'sunset', 'solar_noon', 'day_length',
-            'civil_twilight_begin', 'civil_twilight_end',
-            'calculation_date', 'data_source'
-        ]
+        # Initialize typed result columns (UTC times, day length in seconds)
+        cities_df = add_result_columns(cities_df.copy())
+        cities_df['calculation_date'] = None
+        cities_df['data_source'] = None
         
-        for col in sunrise_data_columns:
-            cities_df[col] = None
+        # Local calendar dates and local clock times depend on each city's timezone
+        cities_df = attach_timezones(cities_df)
         
-        # Process each city
-        for idx, row in cities_df.iterrows():
-            city_name = row['name']
-            lat = row['latitude']
-            lng = row['longitude']
+        if not use_api:
+            self._add_local_batch(cities_df, cities_df.index, target_date, extra_elevations)
+        else:
+            self.sunrise_calculator.set_deadline(deadline_seconds)
+        
+        # Query the API per city; cities it cannot answer (open circuit, failed call, run
+        # deadline) are computed afterwards in one local batch with the same columns
+        for idx, row in (cities_df.iterrows() if use_api else ()):
+            if self.sunrise_calculator.deadline.expired():
+                logger.warning(f"Run deadline of {deadline_seconds}s reached, computing remaining cities locally")
+                break
+            if not self.sunrise_calculator.api_available():
+                continue
             
+            city_name = row['name']
             logger.info(f"Processing {city_name} ({idx + 1}/{len(cities_df)})")
             
-            # Get sunrise/sunset data
-            sun_data = self.sunrise_calculator.get_sunrise_sunset(
-                lat, lng, city_name, use_api, target_date
+            sun_data = self.sunrise_calculator.get_sunrise_sunset_api(
+                row['latitude'], row['longitude'], target_date, row['timezone']
             )
             
             if sun_data:
-                # Update dataframe with sun data
-                for key, value in sun_data.items():
+                # Update dataframe with sun data, parsed once into the typed schema
+                for key, value in typed_record(sun_data).items():
                     if key in cities_df.columns:
                         cities_df.at[idx, key] = value
                 
                 cities_df.at[idx, 'calculation_date'] = target_date.isoformat()
-                cities_df.at[idx, 'data_source'] = 'api' if use_api else 'local'
+                cities_df.at[idx, 'data_source'] = 'api'
             else:
-                logger.warning(f"No sunrise/sunset data obtained for {city_name}")
+                logger.info(f"API failed for {city_name}, computing it locally")
+        
+        if use_api:
+            fallback = cities_df.index[cities_df['data_source'].isna()]
+            if len(fallback):
+                logger.warning(f"Computing {len(fallback)} of {len(cities_df)} cities locally")
+                self._add_local_batch(cities_df, fallback, target_date, extra_elevations)
+            logger.info(f"API circuit breaker: {self.sunrise_calculator.breaker.summary()}")
+            logger.info(f"API rate limit: {self.sunrise_calculator.http.limiter.summary()}")
         
         return cities_df
     
-    def save_to_csv(self, df: pd.DataFrame, filename: str = None) -> str:
+    def _add_local_batch(self, cities_df: pd.DataFrame, index: pd.Index, target_date: date,
+                         extra_elevations: Iterable[float] = ()):
         """
-        Save dataframe to CSV file
+        Fill the given rows with one vectorized local calculation
+        """
+        if len(index) == 0:
+            return
+        batch = self.sunrise_calculator.get_sun_crossings_batch(
+            cities_df.loc[index, 'latitude'], cities_df.loc[index, 'longitude'], target_date, extra_elevations
+        )
+        batch.index = index
+        for col in batch.columns:
+            cities_df.loc[index, col] = batch[col]
+        cities_df.loc[index, 'calculation_date'] = target_date.isoformat()
+        cities_df.loc[index, 'data_source'] = 'local'
+    
+    def resolve_output_path(self, filename: str = None) -> str:
+        """
+        Bare filenames go into the data directory, paths are used as given ('-' is stdout)
         """
         if filename is None:
             filename = OUTPUT_CSV
-        
-        filepath = os.path.join(DATA_DIR, filename) if not os.path.dirname(filename) else filename
+        if filename == '-':
+            return filename
+        return os.path.join(DATA_DIR, filename) if not os.path.dirname(filename) else filename
+    
+    def save_to_csv(self, df: pd.DataFrame, filename: str = None) -> str:
+        """
+        Save dataframe to CSV file (.gz/.zst compressed or .jsonl by extension, '-' for stdout).
+        Times are written as local clock times and day length as H:MM:SS.
+        """
+        filepath = self.resolve_output_path(filename)
         
         try:
-            df.to_csv(filepath, index=False)
+            with StreamingWriter(filepath) as writer:
+                writer.write(format_for_display(df))
             logger.info(f"Saved {len(df)} cities data to {filepath}")
             return filepath
         except Exception as e:
             logger.error(f"Error saving to CSV: {e}")
             return ""
     
-    def parse_day_length_to_hours(self, day_length_str: str) -> float:
+    def write_sunrise_sunset_grid(self, cities_df: pd.DataFrame, start_date: date, end_date: date,
+                                  filename: str, use_api: bool = False,
+                                  chunk_size: int = SOLAR_CHUNK_CITIES) -> int:
         """
-        Convert day_length string (like "16:30:45") to decimal hours
+        Stream sunrise/sunset data for every city and every date in [start_date, end_date]
+        to filename one (date, city chunk) batch at a time, so memory does not grow with
+        the size of the grid. Returns the number of rows written.
         """
-        try:
-            if pd.isna(day_length_str) or not day_length_str:
-                return 0.0
-            
-            # Handle different formats
-            if isinstance(day_length_str, (int, float)):
-                return float(day_length_str)
-            
-            # Parse time format (HH:MM:SS or HH:MM)
-            time_parts = str(day_length_str).split(':')
-            hours = int(time_parts[0]) if len(time_parts) > 0 else 0
-            minutes = int(time_parts[1]) if len(time_parts) > 1 else 0
-            seconds = int(time_parts[2]) if len(time_parts) > 2 else 0
-            
-            return hours + minutes/60.0 + seconds/3600.0
-        except Exception as e:
-            logger.warning(f"Could not parse day length '{day_length_str}': {e}")
+        filepath = self.resolve_output_path(filename)
+        days = (end_date - start_date).days + 1
+        with StreamingWriter(filepath) as writer:
+            for offset in range(days):
+                target_date = start_date + timedelta(days=offset)
+                for begin in range(0, len(cities_df), chunk_size):
+                    chunk = cities_df.iloc[begin:begin + chunk_size].copy()
+                    writer.write(format_for_display(self.add_sunrise_sunset_data(chunk, target_date, use_api)))
+            return writer.rows_written
+    
+    def parse_day_length_to_hours(self, day_length) -> float:
+        """
+        Convert one day_length value to decimal hours: numbers are seconds (as the API and
+        the typed schema store them), strings like "16:30:45" are H:MM:SS
+        """
+        seconds = day_length_seconds([day_length]).iloc[0]
+        if pd.isna(seconds):
+            if day_length is not None and not pd.isna(day_length) and day_length != '':
+                logger.warning(f"Could not parse day length '{day_length}'")
             return 0.0
+        return seconds / 3600.0
     
     def rank_cities_by_daylight(self, df: pd.DataFrame, top_n: int = 20) -> pd.DataFrame:
         """
         Rank cities by amount of daylight and return top N
         """
-        # Parse day length to decimal hours for sorting
-        df['daylight_hours'] = df['day_length'].apply(self.parse_day_length_to_hours)
+        # Day length is stored in seconds, so hours are one vectorized division
+        df['daylight_hours'] = daylight_hours(df)
         
         # Sort by daylight hours (descending) and then by population (descending) for ties
         ranked_df = df.sort_values(['daylight_hours', 'population'], ascending=[False, False])
@@ -188,22 +251,64 @@ class CityDataProcessor:
         # Return top N cities
         return ranked_df.head(top_n)
     
+    def process_sample_cities(self, sample_size: Optional[int] = 10, use_api: bool = True,
+                              target_date: Optional[date] = None,
+                              min_population: int = 200000,
+                              deadline_seconds: Optional[float] = None,
+                              shard: Optional[Tuple[int, int]] = None,
+                              city_filter: Optional[CityFilter] = None) -> pd.DataFrame:
+        """
+        Add sunrise/sunset data to the first sample_size sample cities, or to the first
+        sample_size cities of one (index, count) shard
+        """
+        cities_df = self.load_sample_cities(min_population, city_filter)
+        if shard:
+            cities_df = select_shard(cities_df, *shard)
+        if sample_size:
+            cities_df = cities_df.head(sample_size)
+        
+        return self.add_sunrise_sunset_data(cities_df, target_date, use_api,
+                                            deadline_seconds=deadline_seconds)
+    
     def process_summer_solstice_analysis(self, min_population: int = 200000, 
                                        top_cities: int = 20, 
-                                       use_api: bool = True) -> pd.DataFrame:
+                                       use_api: bool = True,
+                                       deadline_seconds: Optional[float] = None,
+                                       shard: Optional[Tuple[int, int]] = None,
+                                       city_filter: Optional[CityFilter] = None,
+                                       use_cache: bool = True) -> pd.DataFrame:
         """
-        Analyze cities for summer solstice (June 20, 2024) and rank by daylight
+        Analyze cities for summer solstice (June 20, 2024) and rank by daylight.
+        With a shard only that shard's cities are ranked; merge the shards for the global top.
+        Rankings are cached per (date, filter, source, engine, city data), and a cached
+        larger top N answers smaller ones.
         """
-        from datetime import date
         solstice_date = date(2024, 6, 20)
         
         logger.info(f"Loading cities with minimum population {min_population:,}...")
-        cities_df = self.load_sample_cities(min_population)
+        cities_df = self.load_sample_cities(min_population, city_filter)
+        if shard:
+            cities_df = select_shard(cities_df, *shard)
+        
+        filter_key = (city_filter or CityFilter()).with_min_population(min_population).cache_key()
+        cache_key = RankingCache.key(solstice_date, filter_key, use_api, dataset_version(cities_df))
+        if use_cache:
+            cached = self.ranking_cache.get(cache_key, top_cities)
+            if cached is not None:
+                return cached
+        
+        if not use_api:
+            # Only cities in the latitude band that can reach the top need full sun data
+            candidates = LatitudeIndex(cities_df).top_n(solstice_date, top_cities)
+            cities_df = cities_df.loc[candidates.index]
         
         logger.info(f"Processing {len(cities_df)} cities for summer solstice {solstice_date}...")
-        enriched_df = self.add_sunrise_sunset_data(cities_df, solstice_date, use_api)
+        enriched_df = self.add_sunrise_sunset_data(cities_df, solstice_date, use_api,
+                                                   deadline_seconds=deadline_seconds)
         
         logger.info("Ranking cities by daylight hours...")
         top_cities_df = self.rank_cities_by_daylight(enriched_df, top_cities)
+        if use_cache:
+            self.ranking_cache.put(cache_key, top_cities, top_cities_df, use_api)
         
         return top_cities_df
\ No newline at end of file
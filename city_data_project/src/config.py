@@ -15,9 +15,76 @@ GEONAMES_USERNAME = os.getenv('GEONAMES_USERNAME', 'demo')
 DATA_DIR = "data"
 CITIES_CSV = os.path.join(DATA_DIR, "world_cities.csv")
 OUTPUT_CSV = os.path.join(DATA_DIR, "cities_with_sunrise_sunset.csv")
+EPHEMERIS_CACHE_FILE = os.path.join(DATA_DIR, "ephemeris_cache.json")
+RANKING_CACHE_DIR = os.path.join(DATA_DIR, "ranking_cache")
+GEONAMES_CACHE_DIR = os.path.join(DATA_DIR, "geonames_cache")
+# Ranked results kept in memory (each also persisted under RANKING_CACHE_DIR)
+RANKING_CACHE_ENTRIES = 64
 
 # API rate limiting (requests per second)
 RATE_LIMIT = 1
+# Requests that may go out back-to-back before the rate applies; the bucket state is
+# shared by every process on the host through this file
+RATE_LIMIT_BURST = 1
+RATE_LIMIT_STATE_FILE = os.path.join(DATA_DIR, "rate_limit_state.json")
+
+# API timeouts in seconds (connect, read)
+API_TIMEOUT = (3.05, 10.0)
+
+# Shared HTTP connection pool and retry policy (exponential backoff with jitter on 429/5xx)
+HTTP_POOL_SIZE = 10
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_BACKOFF_JITTER = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Longest Retry-After (seconds) honored before giving up on a retry
+HTTP_MAX_RETRY_AFTER = 60.0
+
+# Circuit breaker for the sunrise-sunset API: trip after this many consecutive failures
+# (calls slower than the slow-call threshold count as failures), probe again after reset
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_SLOW_CALL_SECONDS = 5.0
+CIRCUIT_RESET_SECONDS = 30.0
 
 # Minimum population threshold for cities
-MIN_POPULATION = 100000
\ No newline at end of file
+MIN_POPULATION = 100000
+
+# Rows read per chunk when loading (and filtering) large city CSVs
+CSV_CHUNK_ROWS = 100000
+
+# Daylight query service
+SERVICE_HOST = os.getenv('DAYLIGHT_SERVICE_HOST', '127.0.0.1')
+SERVICE_PORT = int(os.getenv('DAYLIGHT_SERVICE_PORT', '8080'))
+SERVICE_WORKERS = 8
+SERVICE_RESULT_CACHE_SIZE = 100000
+SERVICE_MAX_RANGE_DAYS = 366
+SERVICE_MAX_BATCH = 1000
+SERVICE_NEAREST_CITY_KM = 50.0
+# Largest request body accepted (a full batch of queries fits comfortably)
+SERVICE_MAX_BODY_BYTES = 1024 * 1024
+
+# Latency target (milliseconds) for warm local queries
+SERVICE_P99_TARGET_MS = 50.0
+
+# Number of cities evaluated together in vectorized solar computations (bounds memory)
+SOLAR_CHUNK_CITIES = 20000
+# Upper bound on (time, city) cells per block when computing solar positions
+SOLAR_POSITION_BLOCK_CELLS = 2000000
+
+# Async pipeline: rows per chunk, chunks waiting between stages, concurrent compute workers
+PIPELINE_CHUNK_ROWS = 5000
+PIPELINE_QUEUE_SIZE = 4
+PIPELINE_WORKERS = 4
+
+# Global daylight raster generation
+RASTER_RESOLUTION = 0.05
+RASTER_TILE_SIZE = 256
+RASTER_WORKERS = 4
+# Upper bound on cells x days evaluated at once inside a tile (bounds memory per worker)
+RASTER_BLOCK_CELLS = 2000000
+
+# Latitude index for top-N / threshold daylight queries: envelope grid step (degrees)
+# and safety margin (hours) added to the envelope before pruning (the equation of time
+# drifts the computed day length up to ~0.007 h past the declination bound)
+LATITUDE_INDEX_GRID_STEP = 0.1
+LATITUDE_INDEX_MARGIN_HOURS = 0.05
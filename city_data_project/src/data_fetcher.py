@@ -2,26 +2,31 @@
 Data fetching utilities for city information
 """
 import requests
-import time
 import pandas as pd
-from typing import Dict, Optional, List
+from typing import Dict, Iterator, Optional, List
 import logging
-from .config import GEONAMES_USERNAME, GEONAMES_BASE_URL, RATE_LIMIT
+from .config import GEONAMES_USERNAME, GEONAMES_BASE_URL, CSV_CHUNK_ROWS, GEONAMES_CACHE_DIR
+from .city_filter import CityFilter
+from .geonames_dump import iter_geonames_dump, load_country_names, load_geonames_dump
+from .http_client import HttpClient, get_http_client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Standardized names for the world cities CSV columns
+CSV_COLUMN_MAPPING = {
+    'city': 'name',
+    'city_ascii': 'name_ascii',
+    'lat': 'latitude',
+    'lng': 'longitude',
+    'pop': 'population',
+    'country': 'country_name',
+    'iso2': 'country_code'
+}
+
 class CityDataFetcher:
-    def __init__(self):
-        self.session = requests.Session()
-        self.last_request_time = 0
-    
-    def _rate_limit(self):
-        """Implement rate limiting"""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < (1.0 / RATE_LIMIT):
-            time.sleep((1.0 / RATE_LIMIT) - elapsed)
-        self.last_request_time = time.time()
+    def __init__(self, http_client: Optional[HttpClient] = None):
+        self.http = http_client or get_http_client()
     
     def get_geonames_cities(self, country_code: str = "", max_rows: int = 1000) -> List[Dict]:
         """
@@ -31,8 +36,6 @@ class CityDataFetcher:
             logger.warning("Using demo username or no username set. Please register at geonames.org and set GEONAMES_USERNAME in .env file")
             logger.warning("Demo account has severe rate limits and should not be used for real applications")
         
-        self._rate_limit()
-        
         params = {
             'username': GEONAMES_USERNAME,
             'featureClass': 'P',  # Populated places
@@ -44,7 +47,7 @@ class CityDataFetcher:
             params['country'] = country_code
         
         try:
-            response = self.session.get(f"{GEONAMES_BASE_URL}/searchJSON", params=params)
+            response = self.http.get(f"{GEONAMES_BASE_URL}/searchJSON", params=params)
             response.raise_for_status()
             data = response.json()
             
@@ -66,7 +69,7 @@ class CityDataFetcher:
         """
         try:
             logger.info(f"Downloading world cities data from {url}")
-            response = self.session.get(url, stream=True)
+            response = self.http.get(url, throttle=False, stream=True)
             response.raise_for_status()
             
             with open(output_path, 'wb') as f:
@@ -80,29 +83,21 @@ class CityDataFetcher:
             logger.error(f"Error downloading cities data: {e}")
             return False
     
-    def load_cities_from_csv(self, csv_path: str, min_population: int = 0) -> pd.DataFrame:
+    def load_cities_from_csv(self, csv_path: str, min_population: int = 0,
+                             city_filter: Optional[CityFilter] = None,
+                             chunksize: int = CSV_CHUNK_ROWS) -> pd.DataFrame:
         """
-        Load cities from CSV file and filter by population
+        Load cities from CSV (or Parquet) file, dropping filtered rows while reading:
+        per chunk for CSV, through Arrow dataset filters for Parquet
         """
+        city_filter = (city_filter or CityFilter()).with_min_population(min_population)
+        
         try:
-            df = pd.read_csv(csv_path)
-            
-            # Standardize column names
-            column_mapping = {
-                'city': 'name',
-                'city_ascii': 'name_ascii', 
-                'lat': 'latitude',
-                'lng': 'longitude',
-                'pop': 'population',
-                'country': 'country_name',
-                'iso2': 'country_code'
-            }
-            
-            df = df.rename(columns=column_mapping)
-            
-            # Filter by population
-            if min_population > 0:
-                df = df[df['population'] >= min_population]
+            if csv_path.endswith('.parquet'):
+                df = self._load_parquet(csv_path, CSV_COLUMN_MAPPING, city_filter)
+            else:
+                chunks = list(self.iter_cities_from_csv(csv_path, city_filter=city_filter, chunksize=chunksize))
+                df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
             
             # Remove rows with missing coordinates
             df = df.dropna(subset=['latitude', 'longitude'])
@@ -112,4 +107,64 @@ class CityDataFetcher:
             
         except Exception as e:
             logger.error(f"Error loading cities from CSV: {e}")
-            return pd.DataFrame()
\ No newline at end of file
+            return pd.DataFrame()
+    
+    def iter_cities_from_csv(self, csv_path: str, min_population: int = 0,
+                             city_filter: Optional[CityFilter] = None,
+                             chunksize: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """
+        Yield standardized, filtered city chunks of a CSV file without loading the whole file
+        """
+        city_filter = (city_filter or CityFilter()).with_min_population(min_population)
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk = city_filter.apply(chunk.rename(columns=CSV_COLUMN_MAPPING))
+            chunk = chunk.dropna(subset=['latitude', 'longitude'])
+            if len(chunk):
+                yield chunk
+    
+    def load_geonames_dump(self, dump_path: str, min_population: int = 0,
+                           city_filter: Optional[CityFilter] = None,
+                           country_info_path: Optional[str] = None,
+                           use_cache: bool = True) -> pd.DataFrame:
+        """
+        Load cities from a local GeoNames dump (.txt or .zip) instead of the rate-limited API.
+        Country names come from country_info_path (countryInfo.txt); without it country
+        columns hold ISO codes.
+        """
+        city_filter = (city_filter or CityFilter()).with_min_population(min_population)
+        
+        try:
+            country_names = load_country_names(country_info_path) if country_info_path else None
+            df = load_geonames_dump(dump_path, city_filter, country_names,
+                                    cache_dir=GEONAMES_CACHE_DIR if use_cache else None)
+            logger.info(f"Loaded {len(df)} cities from {dump_path}")
+            return df
+            
+        except Exception as e:
+            logger.error(f"Error loading cities from GeoNames dump: {e}")
+            return pd.DataFrame()
+    
+    def iter_geonames_dump(self, dump_path: str, min_population: int = 0,
+                           city_filter: Optional[CityFilter] = None,
+                           country_info_path: Optional[str] = None,
+                           chunksize: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """
+        Yield filtered city chunks of a GeoNames dump without loading the whole file
+        """
+        city_filter = (city_filter or CityFilter()).with_min_population(min_population)
+        country_names = load_country_names(country_info_path) if country_info_path else None
+        return iter_geonames_dump(dump_path, city_filter, country_names, chunksize=chunksize)
+    
+    def _load_parquet(self, path: str, column_mapping: Dict[str, str], city_filter: CityFilter) -> pd.DataFrame:
+        """
+        Read a Parquet file with the filter pushed down into pyarrow
+        """
+        try:
+            import pyarrow.dataset as ds
+        except ImportError:
+            raise ImportError("pyarrow is required for Parquet city files (pip install pyarrow)")
+        
+        dataset = ds.dataset(path, format='parquet')
+        standardized = {column_mapping.get(name, name): name for name in dataset.schema.names}
+        table = dataset.to_table(filter=city_filter.arrow_expression(standardized))
+        return table.to_pandas().rename(columns=column_mapping)
@@ -0,0 +1,111 @@
+"""
+Global daylight-hours rasters computed tile by tile into an on-disk array
+"""
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Iterator, Optional, Tuple
+import numpy as np
+from .config import RASTER_RESOLUTION, RASTER_TILE_SIZE, RASTER_WORKERS, RASTER_BLOCK_CELLS
+from .daylight_search import date_grid
+from .solar_engine import event_minutes, day_length_from_events
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_BOUNDS = (-90.0, 90.0, -180.0, 180.0)
+
+
+def raster_axes(resolution: float = RASTER_RESOLUTION,
+                bounds: Tuple[float, float, float, float] = GLOBAL_BOUNDS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cell-centre latitudes (north to south, map row order) and longitudes (west to east)
+    """
+    lat_min, lat_max, lng_min, lng_max = bounds
+    rows = int(round((lat_max - lat_min) / resolution))
+    cols = int(round((lng_max - lng_min) / resolution))
+    latitudes = lat_max - (np.arange(rows) + 0.5) * resolution
+    longitudes = lng_min + (np.arange(cols) + 0.5) * resolution
+    return latitudes, longitudes
+
+
+def tile_windows(rows: int, cols: int, tile_size: int = RASTER_TILE_SIZE) -> Iterator[Tuple[slice, slice]]:
+    for row in range(0, rows, tile_size):
+        for col in range(0, cols, tile_size):
+            yield slice(row, min(row + tile_size, rows)), slice(col, min(col + tile_size, cols))
+
+
+def compute_tile(latitudes: np.ndarray, longitudes: np.ndarray, days: np.ndarray,
+                 dtype: str = 'float32') -> np.ndarray:
+    """
+    Daylight hours for one tile, shape (len(days), len(latitudes), len(longitudes))
+    """
+    lat, lng = np.meshgrid(latitudes, longitudes, indexing='ij')
+    cells = lat.size
+    tile = np.empty((len(days), lat.shape[0], lat.shape[1]), dtype=dtype)
+    step = max(1, RASTER_BLOCK_CELLS // cells)
+    for begin in range(0, len(days), step):
+        block = days[begin:begin + step]
+        hours = day_length_from_events(event_minutes(lat.ravel(), lng.ravel(), block))
+        tile[begin:begin + len(block)] = hours.reshape(len(block), *lat.shape)
+    return tile
+
+
+def _write_tile(path: str, rows: slice, cols: slice, latitudes: np.ndarray,
+                longitudes: np.ndarray, days: np.ndarray) -> Tuple[slice, slice]:
+    """
+    Worker entry point: compute one tile and write it straight into the memory-mapped output
+    """
+    output = np.load(path, mmap_mode='r+')
+    output[:, rows, cols] = compute_tile(latitudes[rows], longitudes[cols], days, output.dtype)
+    output.flush()
+    del output
+    return rows, cols
+
+
+def generate_daylight_raster(output_path: str, start: date, end: Optional[date] = None,
+                             resolution: float = RASTER_RESOLUTION,
+                             bounds: Tuple[float, float, float, float] = GLOBAL_BOUNDS,
+                             tile_size: int = RASTER_TILE_SIZE, dtype: str = 'float32',
+                             workers: int = RASTER_WORKERS) -> np.memmap:
+    """
+    Daylight hours for every cell and every date in [start, end], written to a .npy file
+    of shape (days, rows, cols) that is opened as a memory map, so memory stays bounded by
+    the tiles in flight. Row 0 is the northern edge. Georeferencing goes to <output>.json.
+    """
+    days = date_grid(start, end or start)
+    latitudes, longitudes = raster_axes(resolution, bounds)
+    shape = (len(days), len(latitudes), len(longitudes))
+
+    output = np.lib.format.open_memmap(output_path, mode='w+', dtype=dtype, shape=shape)
+    del output
+    with open(f"{output_path}.json", 'w') as f:
+        json.dump({
+            'dates': [str(d) for d in days],
+            'resolution': resolution,
+            'bounds': {'south': bounds[0], 'north': bounds[1], 'west': bounds[2], 'east': bounds[3]},
+            'origin': 'north-west',
+            'dtype': str(np.dtype(dtype)),
+            'units': 'hours'
+        }, f, indent=2)
+
+    windows = list(tile_windows(shape[1], shape[2], tile_size))
+    logger.info(f"Generating {shape[1]}x{shape[2]} raster for {len(days)} day(s) "
+                f"in {len(windows)} tiles with {workers} worker(s)")
+    started = time.time()
+
+    if workers <= 1:
+        for rows, cols in windows:
+            _write_tile(output_path, rows, cols, latitudes, longitudes, days)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_write_tile, output_path, rows, cols, latitudes, longitudes, days)
+                       for rows, cols in windows]
+            for done, future in enumerate(futures, start=1):
+                future.result()
+                if done % 100 == 0:
+                    logger.info(f"Finished {done}/{len(windows)} tiles")
+
+    logger.info(f"Raster written to {output_path} in {time.time() - started:.1f}s")
+    return np.load(output_path, mmap_mode='r')
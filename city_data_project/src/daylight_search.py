@@ -0,0 +1,142 @@
+"""
+Batch searches over a date range: daylight extremes, polar periods and threshold crossings
+"""
+import logging
+from datetime import date
+from typing import Iterator, Tuple
+import numpy as np
+import pandas as pd
+from .config import SOLAR_CHUNK_CITIES
+from .solar_engine import event_minutes, day_length_from_events, ALWAYS_ABOVE, ALWAYS_BELOW
+from .timezones import attach_timezones, utc_offset_minutes
+
+logger = logging.getLogger(__name__)
+
+
+def date_grid(start: date, end: date) -> np.ndarray:
+    """
+    All dates from start to end inclusive as datetime64[D]
+    """
+    return np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+
+
+def _city_chunks(cities_df: pd.DataFrame, chunk_size: int = SOLAR_CHUNK_CITIES) -> Iterator[Tuple[slice, pd.DataFrame]]:
+    for begin in range(0, len(cities_df), chunk_size):
+        yield slice(begin, begin + chunk_size), cities_df.iloc[begin:begin + chunk_size]
+
+
+def _first_true(mask: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """
+    First date where mask is True along the date axis (NaT when never)
+    """
+    first = mask.argmax(axis=0)
+    return np.where(mask.any(axis=0), days[first], np.datetime64('NaT'))
+
+
+def _longest_run(mask: np.ndarray, days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and end date of the longest run of True along the date axis (NaT when none)
+    """
+    idx = np.arange(mask.shape[0]).reshape(-1, 1)
+    last_false = np.maximum.accumulate(np.where(mask, -1, idx), axis=0)
+    run_length = np.where(mask, idx - last_false, 0)
+    end = run_length.argmax(axis=0)
+    length = run_length.max(axis=0)
+    found = length > 0
+    start = np.where(found, end - length + 1, 0)
+    return (np.where(found, days[start], np.datetime64('NaT')),
+            np.where(found, days[end], np.datetime64('NaT')))
+
+
+def _parse_clock(clock: str) -> float:
+    parts = [int(p) for p in clock.split(':')]
+    parts += [0] * (3 - len(parts))
+    return parts[0] * 60.0 + parts[1] + parts[2] / 60.0
+
+
+def daylight_extremes(cities_df: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    """
+    Date and length of the longest and shortest day per city within [start, end].
+    Ties (e.g. a run of 24h polar days) resolve to the first date.
+    """
+    days = date_grid(start, end)
+    result = cities_df.copy()
+    columns = {c: np.empty(len(cities_df), dtype=t) for c, t in [
+        ('longest_day_date', 'datetime64[D]'), ('longest_day_hours', float),
+        ('shortest_day_date', 'datetime64[D]'), ('shortest_day_hours', float)]}
+
+    for rows, chunk in _city_chunks(cities_df):
+        hours = day_length_from_events(event_minutes(chunk['latitude'], chunk['longitude'], days))
+        longest, shortest = hours.argmax(axis=0), hours.argmin(axis=0)
+        cols = np.arange(hours.shape[1])
+        columns['longest_day_date'][rows] = days[longest]
+        columns['longest_day_hours'][rows] = hours[longest, cols]
+        columns['shortest_day_date'][rows] = days[shortest]
+        columns['shortest_day_hours'][rows] = hours[shortest, cols]
+
+    for name, values in columns.items():
+        result[name] = values
+    logger.info(f"Found daylight extremes for {len(cities_df)} cities over {len(days)} days")
+    return result
+
+
+def polar_periods(cities_df: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    """
+    Start and end of the longest polar day and polar night run per city within [start, end].
+    Pick a window that contains the whole period, e.g. July to June for northern polar night.
+    """
+    days = date_grid(start, end)
+    result = cities_df.copy()
+    columns = {c: np.full(len(cities_df), np.datetime64('NaT'), dtype='datetime64[D]') for c in
+               ('polar_day_start', 'polar_day_end', 'polar_night_start', 'polar_night_end')}
+
+    for rows, chunk in _city_chunks(cities_df):
+        status = event_minutes(chunk['latitude'], chunk['longitude'], days)['status']
+        columns['polar_day_start'][rows], columns['polar_day_end'][rows] = _longest_run(status == ALWAYS_ABOVE, days)
+        columns['polar_night_start'][rows], columns['polar_night_end'][rows] = _longest_run(status == ALWAYS_BELOW, days)
+
+    for name, values in columns.items():
+        result[name] = values
+    return result
+
+
+def first_date_daylight(cities_df: pd.DataFrame, start: date, end: date, hours: float,
+                        at_least: bool = True) -> pd.DataFrame:
+    """
+    First date in [start, end] with at least (or at most) the given hours of daylight
+    """
+    days = date_grid(start, end)
+    result = cities_df.copy()
+    first = np.empty(len(cities_df), dtype='datetime64[D]')
+
+    for rows, chunk in _city_chunks(cities_df):
+        day_hours = day_length_from_events(event_minutes(chunk['latitude'], chunk['longitude'], days))
+        first[rows] = _first_true(day_hours >= hours if at_least else day_hours <= hours, days)
+
+    result['first_date'] = first
+    return result
+
+
+def first_date_event(cities_df: pd.DataFrame, start: date, end: date, event: str = 'sunset',
+                     clock: str = '21:00', after: bool = True) -> pd.DataFrame:
+    """
+    First date in [start, end] on which sunrise/sunset happens after (or before) a local
+    clock time, e.g. the first date sunset is after 21:00. DST is taken into account.
+    """
+    if event not in ('sunrise', 'sunset'):
+        raise ValueError(f"event must be 'sunrise' or 'sunset', not {event!r}")
+
+    days = date_grid(start, end)
+    threshold = _parse_clock(clock)
+    cities_df = attach_timezones(cities_df.copy())
+    first = np.empty(len(cities_df), dtype='datetime64[D]')
+
+    for rows, chunk in _city_chunks(cities_df):
+        events = event_minutes(chunk['latitude'], chunk['longitude'], days)
+        local = events['rise' if event == 'sunrise' else 'set'] + utc_offset_minutes(chunk['timezone'], days)
+        with np.errstate(invalid='ignore'):
+            mask = local >= threshold if after else local <= threshold
+        first[rows] = _first_true(mask & ~np.isnan(local), days)
+
+    cities_df['first_date'] = first
+    return cities_df
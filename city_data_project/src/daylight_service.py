@@ -0,0 +1,382 @@
+"""
+Long-running daylight query service with warm in-memory caches
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from .city_processor import CityDataProcessor
+from .city_filter import CityFilter
+from .timezones import resolve_timezone
+from .config import (SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_RESULT_CACHE_SIZE,
+                     SERVICE_MAX_RANGE_DAYS, SERVICE_MAX_BATCH, SERVICE_P99_TARGET_MS,
+                     SERVICE_NEAREST_CITY_KM, SERVICE_MAX_BODY_BYTES)
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class ServiceError(Exception):
+    """Invalid query sent to the daylight service"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class CityIndex:
+    """
+    In-memory city table with name lookup and a 1-degree grid for nearest-city queries
+    """
+
+    def __init__(self, cities: List[Dict]):
+        self.cities = cities
+        self.by_name: Dict[str, Dict] = {}
+        self.grid: Dict[Tuple[int, int], List[Dict]] = {}
+
+        for city in cities:
+            self.by_name.setdefault(city['name'].lower(), city)
+            cell = (math.floor(city['latitude']), math.floor(city['longitude']))
+            self.grid.setdefault(cell, []).append(city)
+
+    def get(self, name: str) -> Optional[Dict]:
+        return self.by_name.get(name.strip().lower())
+
+    def nearest(self, lat: float, lng: float, max_km: float = SERVICE_NEAREST_CITY_KM) -> Optional[Dict]:
+        """
+        Find the closest known city within max_km using the surrounding grid cells
+        """
+        best, best_km = None, max_km
+        base_lat, base_lng = math.floor(lat), math.floor(lng)
+        # One degree of latitude is ~111 km; longitude cells shrink towards the poles
+        lat_cells = math.ceil(max_km / 111.0)
+        lng_cells = min(180, math.ceil(max_km / (111.0 * max(math.cos(math.radians(abs(lat) + lat_cells)), 0.01))))
+        for dlat in range(-lat_cells, lat_cells + 1):
+            for dlng in range(-lng_cells, lng_cells + 1):
+                cell_lng = (base_lng + dlng + 180) % 360 - 180
+                for city in self.grid.get((base_lat + dlat, cell_lng), ()):
+                    km = haversine_km(lat, lng, city['latitude'], city['longitude'])
+                    if km <= best_km:
+                        best, best_km = city, km
+        return best
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Great-circle distance between two points in kilometres
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class LatencyTracker:
+    """
+    Rolling window of request latencies for percentile reporting
+    """
+
+    def __init__(self, window: int = 10000):
+        self.samples = deque(maxlen=window)
+        self.total = 0
+
+    def record(self, seconds: float):
+        self.samples.append(seconds * 1000.0)
+        self.total += 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+        return ordered[rank]
+
+    def summary(self) -> Dict:
+        return {
+            'requests': self.total,
+            'p50_ms': round(self.percentile(50), 3),
+            'p95_ms': round(self.percentile(95), 3),
+            'p99_ms': round(self.percentile(99), 3),
+            'p99_target_ms': SERVICE_P99_TARGET_MS,
+        }
+
+
+class DaylightService:
+    """
+    Answers daylight queries from a warm city table and result cache.
+
+    Identical queries that arrive while one is already being computed share
+    the same in-flight future instead of being computed twice.
+    """
+
+    def __init__(self, processor: Optional[CityDataProcessor] = None,
+                 min_population: int = 0, workers: int = SERVICE_WORKERS,
+                 cache_size: int = SERVICE_RESULT_CACHE_SIZE, city_filter: Optional[CityFilter] = None):
+        self.processor = processor or CityDataProcessor()
+        self.calculator = self.processor.sunrise_calculator
+        self.index = CityIndex(self.processor.load_sample_cities(min_population, city_filter).to_dict('records'))
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='daylight')
+        self.cache: OrderedDict = OrderedDict()
+        self.cache_size = cache_size
+        self.in_flight: Dict[Tuple, asyncio.Future] = {}
+        self.latency = LatencyTracker()
+        self.stats = {'cache_hits': 0, 'cache_misses': 0, 'coalesced': 0}
+        logger.info(f"Daylight service warmed with {len(self.index)} cities")
+
+    def _cache_get(self, key: Tuple) -> Optional[Dict]:
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+        return result
+
+    def _cache_put(self, key: Tuple, result: Dict):
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def _resolve_location(self, query: Dict) -> Dict:
+        """
+        Turn a query into a location: either a known city name or a coordinate
+        """
+        if query.get('city'):
+            city = self.index.get(str(query['city']))
+            if city is None:
+                raise ServiceError(f"Unknown city: {query['city']}", status=404)
+            return {'name': city['name'], 'country': city.get('country'),
+                    'latitude': city['latitude'], 'longitude': city['longitude'],
+                    'timezone': resolve_timezone(city.get('country'), city['latitude'], city['longitude'])}
+
+        try:
+            lat = float(query['lat'])
+            lng = float(query['lng'])
+        except (KeyError, TypeError, ValueError):
+            raise ServiceError("Query needs either 'city' or numeric 'lat' and 'lng'")
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+            raise ServiceError(f"Coordinate out of range: {lat}, {lng}")
+
+        nearest = self.index.nearest(lat, lng)
+        country = nearest.get('country') if nearest else None
+        return {'name': nearest['name'] if nearest else "", 'country': country,
+                'latitude': lat, 'longitude': lng, 'nearest_city': nearest['name'] if nearest else None,
+                'timezone': resolve_timezone(country, lat, lng)}
+
+    def _resolve_dates(self, query: Dict) -> List[date]:
+        try:
+            if query.get('start') or query.get('end'):
+                start = date.fromisoformat(str(query.get('start') or query.get('end')))
+                end = date.fromisoformat(str(query.get('end') or query.get('start')))
+            else:
+                start = end = date.fromisoformat(str(query['date'])) if query.get('date') else date.today()
+        except ValueError:
+            raise ServiceError("Dates must be in YYYY-MM-DD format")
+
+        days = (end - start).days + 1
+        if days < 1:
+            raise ServiceError("'end' must not be before 'start'")
+        if days > SERVICE_MAX_RANGE_DAYS:
+            raise ServiceError(f"Date range limited to {SERVICE_MAX_RANGE_DAYS} days")
+        return [start + timedelta(days=i) for i in range(days)]
+
+    async def _sun_data(self, lat: float, lng: float, name: str, target_date: date, use_api: bool,
+                        timezone: Optional[str] = None) -> Dict:
+        """
+        Compute (or reuse) sun data for one location and local date
+        """
+        key = (round(lat, 4), round(lng, 4), target_date, use_api, timezone)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(pending)
+
+        self.stats['cache_misses'] += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self.calculator.get_sunrise_sunset,
+                                      lat, lng, name, use_api, target_date, timezone)
+        self.in_flight[key] = future
+        try:
+            result = await future
+        finally:
+            self.in_flight.pop(key, None)
+
+        # An API query answered by the local fallback is not cached, so it is retried later
+        if result and result.get('data_source') == ('api' if use_api else 'local'):
+            self._cache_put(key, result)
+        return result
+
+    async def query(self, query: Dict) -> Dict:
+        """
+        Answer a single query: city or coordinate, single date or date range
+        """
+        location = self._resolve_location(query)
+        dates = self._resolve_dates(query)
+        use_api = str(query.get('source', 'local')).lower() == 'api'
+
+        sun_data = await asyncio.gather(*[
+            self._sun_data(location['latitude'], location['longitude'], location['name'], d, use_api,
+                           location['timezone'])
+            for d in dates
+        ])
+
+        days = []
+        for d, data in zip(dates, sun_data):
+            day = {'date': d.isoformat(), 'data_source': 'api' if use_api else 'local'}
+            day.update(data)
+            days.append(day)
+        return {'location': location, 'days': days}
+
+    async def batch(self, queries: List[Dict]) -> List[Dict]:
+        """
+        Answer many queries at once; one bad query does not fail the batch
+        """
+        if len(queries) > SERVICE_MAX_BATCH:
+            raise ServiceError(f"Batch limited to {SERVICE_MAX_BATCH} queries")
+
+        async def run(q):
+            try:
+                return await self.query(q)
+            except ServiceError as e:
+                return {'error': str(e), 'status': e.status, 'query': q}
+
+        return await asyncio.gather(*[run(q) for q in queries])
+
+    def health(self) -> Dict:
+        summary = self.latency.summary()
+        summary.update(self.stats)
+        summary['cities'] = len(self.index)
+        summary['cached_results'] = len(self.cache)
+        summary['in_flight'] = len(self.in_flight)
+        summary['p99_within_target'] = summary['p99_ms'] <= SERVICE_P99_TARGET_MS
+        return summary
+
+    async def _route(self, method: str, target: str, body: bytes) -> Tuple[int, object]:
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == '/health' and method == 'GET':
+            return 200, self.health()
+        if url.path == '/daylight' and method == 'GET':
+            return 200, await self.query(params)
+        if url.path == '/daylight/batch' and method == 'POST':
+            try:
+                payload = json.loads(body or b'{}')
+            except ValueError:
+                raise ServiceError("Request body must be JSON")
+            queries = payload.get('queries') if isinstance(payload, dict) else payload
+            if not isinstance(queries, list):
+                raise ServiceError("Batch body must be a list or {'queries': [...]}")
+            return 200, {'results': await self.batch(queries)}
+        raise ServiceError(f"No route for {method} {url.path}", status=404)
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ServiceError("Invalid Content-Length header")
+        if length > SERVICE_MAX_BODY_BYTES:
+            raise ServiceError(f"Request body limited to {SERVICE_MAX_BODY_BYTES} bytes", status=413)
+        return await reader.readexactly(length) if length else b''
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Minimal HTTP/1.1 handler with keep-alive
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                try:
+                    body = await self._read_body(reader, headers)
+                except ServiceError as e:
+                    # The body was not read, so the connection cannot be reused
+                    status, payload = e.status, {'error': str(e)}
+                    keep_alive = False
+                else:
+                    started = time.perf_counter()
+                    try:
+                        status, payload = await self._route(method.upper(), target, body)
+                    except ServiceError as e:
+                        status, payload = e.status, {'error': str(e)}
+                    except Exception as e:
+                        logger.error(f"Error handling {method} {target}: {e}")
+                        status, payload = 500, {'error': 'internal error'}
+                    self.latency.record(time.perf_counter() - started)
+
+                data = json.dumps(payload, default=str).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _report_latency(self, interval: float = 60.0):
+        while True:
+            await asyncio.sleep(interval)
+            summary = self.latency.summary()
+            if summary['requests'] and summary['p99_ms'] > SERVICE_P99_TARGET_MS:
+                logger.warning(f"p99 latency {summary['p99_ms']:.1f}ms exceeds target {SERVICE_P99_TARGET_MS}ms")
+
+    async def serve(self, host: str = SERVICE_HOST, port: int = SERVICE_PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        reporter = asyncio.create_task(self._report_latency())
+        logger.info(f"Daylight service listening on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reporter.cancel()
+            self.executor.shutdown(wait=False)
+
+
+def run_service(host: str = SERVICE_HOST, port: int = SERVICE_PORT, min_population: int = 0,
+                city_filter: Optional[CityFilter] = None):
+    """
+    Start the daylight service over the (filtered) sample cities and block until interrupted
+    """
+    service = DaylightService(min_population=min_population, city_filter=city_filter)
+    try:
+        asyncio.run(service.serve(host, port))
+    except KeyboardInterrupt:
+        logger.info("Daylight service stopped")
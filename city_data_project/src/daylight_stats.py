@@ -0,0 +1,133 @@
+"""
+Derived daylight statistics for whole city tables: daily rate of change of day length,
+sunrise and sunset, and total daylight over a date range
+"""
+import logging
+from datetime import date, timedelta
+from typing import Dict
+import numpy as np
+import pandas as pd
+from .daylight_search import date_grid, _city_chunks
+from .ephemeris import get_ephemeris
+from .solar_engine import (event_minutes, day_length_from_events, day_length_hours,
+                           NORMAL, SUNRISE_ELEVATION)
+
+logger = logging.getLogger(__name__)
+
+CHANGE_COLUMNS = ['day_length_change_min', 'sunrise_change_min', 'sunset_change_min']
+
+# Cities whose hour-angle cosine reaches this on any day (near polar day/night) are summed
+# with the full event calculation; below it the noon-declination shortcut is within
+# 0.06 hours per year of the day-by-day sum
+TOTAL_EXACT_COS_H = 0.95
+TOTAL_DAYS_PER_BLOCK = 92
+
+
+def change_arrays(latitudes, longitudes, start: date, end: date) -> Dict[str, np.ndarray]:
+    """
+    Minutes per day that day length, sunrise and sunset change on every date in [start, end].
+
+    One pass over the range plus one day on each side; the rate is the central difference
+    of neighbouring days. Arrays have shape (days, cities). Sunrise/sunset changes are NaN
+    when either neighbour has no sunrise/sunset (polar day or night).
+    """
+    days = date_grid(start - timedelta(days=1), end + timedelta(days=1))
+    events = event_minutes(latitudes, longitudes, days)
+    day_minutes = day_length_from_events(events) * 60.0
+    normal = events['status'] == NORMAL
+
+    def central(values: np.ndarray) -> np.ndarray:
+        return (values[2:] - values[:-2]) / 2.0
+
+    both = normal[2:] & normal[:-2]
+    return {
+        'day_length': central(day_minutes),
+        'sunrise': np.where(both, central(events['rise']), np.nan),
+        'sunset': np.where(both, central(events['set']), np.nan),
+    }
+
+
+def daily_changes(cities_df: pd.DataFrame, target_date: date) -> pd.DataFrame:
+    """
+    Add minutes-per-day change of day length, sunrise and sunset on target_date to every city
+    (positive day_length_change_min means days are getting longer)
+    """
+    result = cities_df.copy()
+    columns = {c: np.empty(len(cities_df)) for c in CHANGE_COLUMNS}
+    for rows, chunk in _city_chunks(cities_df):
+        changes = change_arrays(chunk['latitude'], chunk['longitude'], target_date, target_date)
+        for column, key in zip(CHANGE_COLUMNS, ('day_length', 'sunrise', 'sunset')):
+            columns[column][rows] = changes[key][0]
+    for column, values in columns.items():
+        result[column] = values
+    return result
+
+
+def daily_changes_range(cities_df: pd.DataFrame, start: date, end: date) -> pd.DataFrame:
+    """
+    Long table (date, city index, change columns) for every city and every date in [start, end]
+    """
+    days = pd.to_datetime(date_grid(start, end)).date
+    frames = []
+    for rows, chunk in _city_chunks(cities_df):
+        changes = change_arrays(chunk['latitude'], chunk['longitude'], start, end)
+        frame = pd.DataFrame({
+            'date': np.repeat(days, len(chunk)),
+            'city': np.tile(chunk.index.to_numpy(), len(days)),
+        })
+        for column, key in zip(CHANGE_COLUMNS, ('day_length', 'sunrise', 'sunset')):
+            frame[column] = changes[key].ravel()
+        frames.append(frame)
+    logger.info(f"Computed daily changes for {len(cities_df)} cities over {len(days)} days")
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['date', 'city'] + CHANGE_COLUMNS)
+
+
+def total_daylight_hours(latitudes, longitudes, start: date, end: date) -> np.ndarray:
+    """
+    Hours of daylight per city summed over every date in [start, end].
+
+    Day length is taken from the hour angle at each city's local-noon declination,
+    interpolated from the shared daily ephemeris, so a day costs one arccos per city.
+    Cities that come close to polar day/night are recomputed with the full sunrise/sunset
+    calculation; elsewhere the total is within 0.06 hours per year of summing day_length_hours.
+    """
+    lat = np.clip(np.asarray(latitudes, dtype=float).reshape(1, -1), -89.8, 89.8)
+    lng = np.asarray(longitudes, dtype=float).reshape(1, -1)
+    grid = date_grid(start, end)
+    cos_zenith = np.cos(np.radians(90.0 - SUNRISE_ELEVATION))
+    sin_lat, cos_lat = np.sin(np.radians(lat)), np.cos(np.radians(lat))
+    noon_fraction = (720.0 - 4.0 * lng) / 1440.0
+
+    totals = np.zeros(lat.shape[1])
+    near_polar = np.zeros(lat.shape[1], dtype=bool)
+    for begin in range(0, len(grid), TOTAL_DAYS_PER_BLOCK):
+        block = grid[begin:begin + TOTAL_DAYS_PER_BLOCK].astype('int64')
+        declination, _ = get_ephemeris().daily_terms(block[0], block[-1] + 1)
+        decl = declination[:-1].reshape(-1, 1) + np.diff(declination).reshape(-1, 1) * noon_fraction
+        decl = np.radians(decl)
+        cos_h = (cos_zenith - sin_lat * np.sin(decl)) / (cos_lat * np.cos(decl))
+        near_polar |= (np.abs(cos_h) >= TOTAL_EXACT_COS_H).any(axis=0)
+        totals += np.degrees(np.arccos(np.clip(cos_h, -1.0, 1.0))).sum(axis=0) * 2.0 / 15.0
+
+    rows = np.flatnonzero(near_polar)
+    if len(rows):
+        exact = np.zeros(len(rows))
+        for begin in range(0, len(grid), TOTAL_DAYS_PER_BLOCK):
+            exact += day_length_hours(lat[0, rows], lng[0, rows], grid[begin:begin + TOTAL_DAYS_PER_BLOCK]).sum(axis=0)
+        totals[rows] = exact
+    return totals
+
+
+def total_daylight(cities_df: pd.DataFrame, start: date, end: date,
+                   column: str = 'total_daylight_hours') -> pd.DataFrame:
+    """
+    Add total daylight hours over [start, end] (a year, a season, ...) to every city
+    """
+    result = cities_df.copy()
+    values = np.empty(len(cities_df))
+    for rows, chunk in _city_chunks(cities_df):
+        values[rows] = total_daylight_hours(chunk['latitude'], chunk['longitude'], start, end)
+    result[column] = values
+    days = (end - start).days + 1
+    logger.info(f"Summed daylight for {len(cities_df)} cities over {days} days")
+    return result
@@ -0,0 +1,120 @@
+"""
+Per-date solar ephemeris shared by every city: declination and equation of time are
+computed once per date, cached, and interpolated to the exact instant of each event
+"""
+import json
+import logging
+import os
+import threading
+from datetime import date
+from typing import Dict, Optional, Tuple
+import numpy as np
+from .config import EPHEMERIS_CACHE_FILE
+from .solar_engine import solar_terms, UNIX_EPOCH_JD
+
+logger = logging.getLogger(__name__)
+
+# Bump when solar_terms changes so stale persisted terms are ignored
+EPHEMERIS_MODEL = "noaa-astral-1"
+
+# Month/day pairs around solstices and equinoxes; these terms are persisted across runs
+COMMON_MONTH_DAYS = {(3, 19), (3, 20), (3, 21), (6, 20), (6, 21), (6, 22),
+                     (9, 22), (9, 23), (12, 21), (12, 22)}
+
+
+def is_common_date(day_number: int) -> bool:
+    d = np.datetime64(int(day_number), 'D').astype(object)
+    return (d.month, d.day) in COMMON_MONTH_DAYS
+
+
+class Ephemeris:
+    """
+    Cache of daily solar terms keyed by day number (days since 1970-01-01).
+
+    Terms are stored at 00:00 UTC of each date and linearly interpolated in between;
+    over one day that adds well under a second of error to rise/set times.
+    """
+
+    def __init__(self, cache_path: Optional[str] = EPHEMERIS_CACHE_FILE):
+        self.cache_path = cache_path
+        self._terms: Dict[int, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            if data.get('model') != EPHEMERIS_MODEL:
+                logger.info(f"Ignoring ephemeris cache {self.cache_path} built with another model")
+                return
+            for day, (declination, eqtime) in data['terms'].items():
+                self._terms[int(np.datetime64(day, 'D').astype('int64'))] = (declination, eqtime)
+            logger.info(f"Loaded {len(self._terms)} cached ephemeris dates from {self.cache_path}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Could not read ephemeris cache {self.cache_path}: {e}")
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        terms = {str(np.datetime64(day, 'D')): values
+                 for day, values in sorted(self._terms.items()) if is_common_date(day)}
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'model': EPHEMERIS_MODEL, 'terms': terms}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write ephemeris cache {self.cache_path}: {e}")
+
+    def daily_terms(self, first_day: int, last_day: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Declination and equation of time at 00:00 UTC for each day in [first_day, last_day]
+        """
+        days = range(int(first_day), int(last_day) + 1)
+        with self._lock:
+            missing = [d for d in days if d not in self._terms]
+            if missing:
+                declination, eqtime = solar_terms(np.asarray(missing, dtype=float) + UNIX_EPOCH_JD)
+                self._terms.update(zip(missing, zip(declination.tolist(), eqtime.tolist())))
+                if any(is_common_date(d) for d in missing):
+                    self._save()
+            values = np.array([self._terms[d] for d in days])
+        return values[:, 0], values[:, 1]
+
+    def terms_for_date(self, target_date: date) -> Tuple[float, float]:
+        day = int(np.datetime64(target_date, 'D').astype('int64'))
+        declination, eqtime = self.daily_terms(day, day)
+        return float(declination[0]), float(eqtime[0])
+
+    def terms_at(self, jd: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Declination and equation of time at arbitrary Julian days, interpolated from the daily cache
+        """
+        offset = np.asarray(jd, dtype=float) - UNIX_EPOCH_JD
+        day = np.floor(offset)
+        first = int(day.min())
+        declination, eqtime = self.daily_terms(first, int(day.max()) + 1)
+        i = (day - first).astype(np.int64)
+        frac = offset - day
+        return (declination[i] + (declination[i + 1] - declination[i]) * frac,
+                eqtime[i] + (eqtime[i + 1] - eqtime[i]) * frac)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+
+_default_ephemeris: Optional[Ephemeris] = None
+
+
+def get_ephemeris() -> Ephemeris:
+    """
+    Process-wide ephemeris shared by all engines
+    """
+    global _default_ephemeris
+    if _default_ephemeris is None:
+        _default_ephemeris = Ephemeris()
+    return _default_ephemeris
@@ -0,0 +1,165 @@
+"""
+Offline city source from GeoNames dump files (cities500.txt, cities15000.txt,
+allCountries.zip, ...): tab-separated rows streamed with typed, column-pruned
+parsing and filters applied per chunk, optionally cached as Parquet (needs pyarrow)
+"""
+import csv
+import hashlib
+import io
+import logging
+import os
+import zipfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+import pandas as pd
+from .city_filter import CityFilter
+from .config import CSV_CHUNK_ROWS, GEONAMES_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Positions of the columns we keep in the 19-column GeoNames "geoname" table
+GEONAMES_COLUMNS = {
+    0: 'geonameid',
+    1: 'name',
+    2: 'name_ascii',
+    4: 'latitude',
+    5: 'longitude',
+    6: 'feature_class',
+    8: 'country_code',
+    14: 'population',
+    17: 'timezone',
+}
+GEONAMES_DTYPES = {
+    'geonameid': 'int64',
+    'name': str,
+    'name_ascii': str,
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'feature_class': str,
+    'country_code': str,
+    'population': 'int64',
+    'timezone': str,
+}
+# Feature class of populated places (cities, towns, villages)
+POPULATED_PLACE = 'P'
+
+
+def load_country_names(path: str) -> Dict[str, str]:
+    """
+    ISO code -> country name from a GeoNames countryInfo.txt ('#' lines are comments)
+    """
+    info = pd.read_csv(path, sep='\t', comment='#', header=None, usecols=[0, 4], names=['code', 'name'],
+                       dtype=str, keep_default_na=False, quoting=csv.QUOTE_NONE)
+    return dict(zip(info['code'], info['name']))
+
+
+@contextmanager
+def _open_dump(path: str):
+    """
+    Text handle on a dump file, or on the .txt member of a dump zip, without extracting it
+    """
+    if not path.endswith('.zip'):
+        with open(path, encoding='utf-8') as f:
+            yield f
+        return
+    with zipfile.ZipFile(path) as archive:
+        members = [m for m in archive.namelist() if m.endswith('.txt') and not m.lower().startswith('readme')]
+        if not members:
+            raise ValueError(f"No dump .txt file in {path}")
+        with archive.open(members[0]) as raw:
+            yield io.TextIOWrapper(raw, encoding='utf-8')
+
+
+def iter_geonames_dump(path: str, city_filter: Optional[CityFilter] = None,
+                       country_names: Optional[Dict[str, str]] = None,
+                       feature_class: Optional[str] = POPULATED_PLACE,
+                       chunksize: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Yield filtered chunks in the load_cities_from_csv schema. country_name comes from
+    country_names when given, otherwise it is the ISO code (so country filters take codes).
+    """
+    city_filter = city_filter or CityFilter()
+    with _open_dump(path) as f:
+        reader = pd.read_csv(f, sep='\t', header=None, usecols=list(GEONAMES_COLUMNS),
+                             names=range(19), dtype={i: GEONAMES_DTYPES[c] for i, c in GEONAMES_COLUMNS.items()},
+                             quoting=csv.QUOTE_NONE, keep_default_na=False, na_values={4: [''], 5: ['']},
+                             chunksize=chunksize, engine='c')
+        for chunk in reader:
+            chunk = chunk.rename(columns=GEONAMES_COLUMNS)
+            if feature_class:
+                chunk = chunk[chunk['feature_class'] == feature_class]
+            if city_filter.min_population:
+                chunk = chunk[chunk['population'] >= city_filter.min_population]
+            codes = chunk['country_code']
+            chunk = chunk.assign(country_name=codes.map(country_names).fillna(codes) if country_names else codes)
+            chunk = city_filter.apply(chunk.drop(columns='feature_class'))
+            chunk = chunk.dropna(subset=['latitude', 'longitude'])
+            if len(chunk):
+                yield chunk.reset_index(drop=True)
+
+
+def _cache_path(path: str, city_filter: CityFilter, country_names: Optional[Dict[str, str]],
+                feature_class: Optional[str], cache_dir: str) -> str:
+    stat = os.stat(path)
+    names = hashlib.sha1(repr(sorted(country_names.items())).encode()).hexdigest() if country_names else ''
+    parts = [os.path.abspath(path), str(stat.st_size), str(stat.st_mtime_ns),
+             city_filter.cache_key(), str(feature_class), names]
+    key = hashlib.sha1('|'.join(parts).encode()).hexdigest()[:20]
+    return os.path.join(cache_dir, f"{os.path.basename(path)}-{key}.parquet")
+
+
+def _read_cache(path: str) -> Optional[pd.DataFrame]:
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_parquet(path)
+    except Exception as e:
+        logger.warning(f"Could not read GeoNames cache {path}: {e}")
+        return None
+
+
+def _write_cache(path: str, df: pd.DataFrame):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Cached {len(df)} GeoNames cities to {path}")
+    except OSError as e:
+        logger.warning(f"Could not write GeoNames cache: {e}")
+
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def load_geonames_dump(path: str, city_filter: Optional[CityFilter] = None,
+                       country_names: Optional[Dict[str, str]] = None,
+                       feature_class: Optional[str] = POPULATED_PLACE,
+                       cache_dir: Optional[str] = GEONAMES_CACHE_DIR,
+                       chunksize: int = CSV_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Whole filtered dump as one frame. With cache_dir, the result is kept as Parquet and
+    reused until the dump file or the filter changes; without pyarrow nothing is cached.
+    """
+    city_filter = city_filter or CityFilter()
+    if cache_dir and not _parquet_available():
+        logger.warning("pyarrow is not installed, GeoNames dump results will not be cached (pip install pyarrow)")
+        cache_dir = None
+    cache_path = _cache_path(path, city_filter, country_names, feature_class, cache_dir) if cache_dir else None
+    if cache_path:
+        cached = _read_cache(cache_path)
+        if cached is not None:
+            logger.info(f"Loaded {len(cached)} GeoNames cities from cache for {path}")
+            return cached
+
+    chunks = list(iter_geonames_dump(path, city_filter, country_names, feature_class, chunksize))
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(
+        columns=[c for c in GEONAMES_COLUMNS.values() if c != 'feature_class'] + ['country_name'])
+    if cache_path:
+        _write_cache(cache_path, df)
+    return df
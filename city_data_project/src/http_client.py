@@ -0,0 +1,118 @@
+"""
+Shared HTTP layer for the GeoNames and sunrise-sunset clients: one pooled keep-alive
+session with timeouts, retries with backoff and jitter, and per-host throttling shared
+across threads and processes (retries included)
+"""
+import logging
+import random
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .config import (API_TIMEOUT, RATE_LIMIT, HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BACKOFF_FACTOR,
+                     HTTP_BACKOFF_JITTER, HTTP_RETRY_STATUSES, HTTP_MAX_RETRY_AFTER)
+from .rate_limiter import SharedRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class JitteredRetry(Retry):
+    """
+    urllib3 Retry with random jitter added to the exponential backoff and a cap on
+    how long a server-sent Retry-After is honored. With a limiter, every retry also
+    waits for a token from the host's bucket, so retries count against the rate limit.
+    """
+
+    jitter = HTTP_BACKOFF_JITTER
+    max_retry_after = HTTP_MAX_RETRY_AFTER
+
+    def __init__(self, *args, limiter: Optional[SharedRateLimiter] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+        self.host: Optional[str] = None
+
+    def new(self, **kwargs) -> 'JitteredRetry':
+        retry = super().new(**kwargs)
+        retry.limiter, retry.host = self.limiter, self.host
+        return retry
+
+    def increment(self, method=None, url=None, *args, _pool=None, **kwargs) -> 'JitteredRetry':
+        retry = super().increment(method, url, *args, _pool=_pool, **kwargs)
+        if _pool is not None:
+            # Same key as HttpClient.throttle: the URL's netloc, which omits default ports
+            default_port = _pool.port in (None, 80, 443)
+            retry.host = _pool.host if default_port else f"{_pool.host}:{_pool.port}"
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.limiter is not None and self.host:
+            self.limiter.acquire(self.host)
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        return backoff + random.uniform(0, backoff * self.jitter) if backoff > 0 else 0
+
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        if retry_after is not None and retry_after > self.max_retry_after:
+            logger.warning(f"Retry-After of {retry_after:.0f}s exceeds {self.max_retry_after:.0f}s, capping")
+            return self.max_retry_after
+        return retry_after
+
+
+class HttpClient:
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, timeout=API_TIMEOUT,
+                 retries: int = HTTP_RETRIES, backoff_factor: float = HTTP_BACKOFF_FACTOR,
+                 rate_limit: float = RATE_LIMIT, limiter: Optional[SharedRateLimiter] = None):
+        self.timeout = timeout
+        self.limiter = limiter or SharedRateLimiter(rate=rate_limit)
+
+        retry = JitteredRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=HTTP_RETRY_STATUSES,
+            allowed_methods=frozenset({'GET', 'HEAD'}),
+            respect_retry_after_header=True,
+            limiter=self.limiter
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def throttle(self, url: str):
+        """
+        Wait for this host's next request slot; every thread and process on the machine
+        draws from the same per-host bucket. Returns the seconds spent waiting.
+        """
+        return self.limiter.acquire(urlsplit(url).netloc)
+
+    def get(self, url: str, throttle: bool = True, **kwargs) -> requests.Response:
+        """
+        GET through the shared pool with the default timeout and retry policy
+        """
+        if throttle:
+            self.throttle(url)
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client: Optional[HttpClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """
+    Process-wide client shared by every API consumer
+    """
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
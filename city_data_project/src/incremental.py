@@ -0,0 +1,65 @@
+"""
+Incremental recompute: hash each input row and reuse unchanged results from a previous output
+"""
+import logging
+import os
+from datetime import date
+from typing import Iterable, Tuple
+import pandas as pd
+from .ephemeris import EPHEMERIS_MODEL
+from .solar_engine import ENGINE_VERSION
+from .result_schema import coerce_results, SCHEMA_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Input columns that determine a row's computed values
+HASH_COLUMNS = ['latitude', 'longitude', 'timezone']
+
+
+def input_hashes(cities_df: pd.DataFrame, target_date: date) -> pd.Series:
+    """
+    Stable content hash per row of (coordinates, timezone, date, engine and schema version) as hex strings
+    """
+    key = cities_df[[c for c in HASH_COLUMNS if c in cities_df.columns]].copy()
+    key['latitude'] = key['latitude'].round(6)
+    key['longitude'] = key['longitude'].round(6)
+    key['date'] = str(target_date)
+    key['engine'] = f"{ENGINE_VERSION}/{EPHEMERIS_MODEL}/{SCHEMA_VERSION}"
+    hashes = pd.util.hash_pandas_object(key, index=False)
+    return hashes.map('{:016x}'.format)
+
+
+def attach_input_hash(cities_df: pd.DataFrame, target_date: date) -> pd.DataFrame:
+    cities_df = cities_df.copy()
+    cities_df['input_hash'] = input_hashes(cities_df, target_date)
+    return cities_df
+
+
+def reuse_previous(cities_df: pd.DataFrame, previous_path: str,
+                   result_columns: Iterable[str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split hashed cities into (rows whose results are reused from previous_path, rows to compute).
+    Reused rows keep the current input columns and take result_columns from the previous file,
+    brought back to the typed result schema.
+    """
+    result_columns = list(result_columns)
+    if not os.path.exists(previous_path):
+        logger.info(f"No previous output at {previous_path}, computing all {len(cities_df)} rows")
+        return cities_df.iloc[:0], cities_df
+
+    try:
+        previous = pd.read_csv(previous_path, dtype={'input_hash': str}, float_precision='round_trip')
+    except Exception as e:
+        logger.warning(f"Could not read previous output {previous_path}: {e}")
+        return cities_df.iloc[:0], cities_df
+
+    if 'input_hash' not in previous.columns or not set(result_columns) <= set(previous.columns):
+        logger.info(f"Previous output {previous_path} has no reusable hashes, computing all rows")
+        return cities_df.iloc[:0], cities_df
+
+    previous = coerce_results(previous.drop_duplicates('input_hash').set_index('input_hash')[result_columns].copy())
+    hit = cities_df['input_hash'].isin(previous.index)
+    reused = cities_df[hit].drop(columns=[c for c in result_columns if c in cities_df.columns])
+    reused = reused.join(previous, on='input_hash')
+    logger.info(f"Reusing {hit.sum()} unchanged rows from {previous_path}, computing {(~hit).sum()}")
+    return reused, cities_df[~hit]
@@ -0,0 +1,135 @@
+"""
+Latitude-sorted city index that answers top-N and threshold daylight queries by computing
+only the latitude band that can qualify, then verifying the answer exactly
+"""
+import logging
+from datetime import date
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+from .config import LATITUDE_INDEX_GRID_STEP, LATITUDE_INDEX_MARGIN_HOURS
+from .ephemeris import get_ephemeris
+from .solar_engine import day_length_hours, hours_above_at_declination, julian_day, to_day_numbers
+
+logger = logging.getLogger(__name__)
+
+# Span (days from 00:00 UTC of the date) of the instants at which crossing_minutes looks up
+# the declination for any longitude's rise and set, sampled at this many points
+DECLINATION_WINDOW = (-0.5, 1.5)
+DECLINATION_SAMPLES = 49
+
+
+class LatitudeIndex:
+    """
+    Keeps the city table sorted by latitude. For a date, an upper envelope of day length
+    per latitude (over all longitudes, plus a margin) bounds what any city can reach, so
+    a binary search over latitudes yields the only rows worth computing exactly.
+
+    The envelope is the day length at the most favourable declination the sun has while
+    any longitude's sunrise/sunset is solved. Sampling longitudes is not enough: on the
+    first day of polar day the computed day length jumps with longitude and latitude.
+    """
+
+    def __init__(self, cities_df: pd.DataFrame, grid_step: float = LATITUDE_INDEX_GRID_STEP,
+                 margin_hours: float = LATITUDE_INDEX_MARGIN_HOURS):
+        order = np.argsort(cities_df['latitude'].to_numpy(), kind='stable')
+        self.cities = cities_df.iloc[order]
+        self.latitudes = self.cities['latitude'].to_numpy(dtype=float)
+        self.longitudes = self.cities['longitude'].to_numpy(dtype=float)
+        self.grid = np.linspace(-90.0, 90.0, int(round(180.0 / grid_step)) + 1)
+        self.margin_hours = margin_hours
+        self._envelopes: Dict[date, np.ndarray] = {}
+        self.last_computed = 0
+
+    def __len__(self) -> int:
+        return len(self.cities)
+
+    def _cell_upper_bounds(self, target_date: date) -> np.ndarray:
+        """
+        Upper bound of day length for every city inside each grid cell
+        """
+        if target_date not in self._envelopes:
+            jd0 = julian_day(to_day_numbers([target_date]))[0]
+            declination, _ = get_ephemeris().terms_at(jd0 + np.linspace(*DECLINATION_WINDOW, DECLINATION_SAMPLES))
+            envelope = hours_above_at_declination(self.grid, [declination.min(), declination.max()]).max(axis=0)
+            # Within a cell day length is monotone or has a minimum, so an endpoint is the max
+            self._envelopes[target_date] = np.maximum(envelope[:-1], envelope[1:]) + self.margin_hours
+        return self._envelopes[target_date]
+
+    def _band(self, target_date: date, threshold: float) -> List[Tuple[int, int]]:
+        """
+        Row ranges (in latitude order) of every city that could have >= threshold hours
+        """
+        possible = self._cell_upper_bounds(target_date) >= threshold
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], possible.astype(np.int8), [0]))))
+        ranges = []
+        for start_cell, end_cell in zip(edges[::2], edges[1::2]):
+            lo = np.searchsorted(self.latitudes, self.grid[start_cell], side='left')
+            hi = np.searchsorted(self.latitudes, self.grid[end_cell], side='right')
+            if hi > lo:
+                ranges.append((int(lo), int(hi)))
+        return ranges
+
+    @staticmethod
+    def _rows(ranges: List[Tuple[int, int]]) -> np.ndarray:
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate([np.arange(lo, hi) for lo, hi in ranges]))
+
+    def _compute(self, target_date: date, rows: np.ndarray, hours: np.ndarray):
+        todo = rows[np.isnan(hours[rows])]
+        if len(todo):
+            hours[todo] = day_length_hours(self.latitudes[todo], self.longitudes[todo], [target_date])[0]
+            self.last_computed += len(todo)
+
+    def _result(self, rows: np.ndarray, hours: np.ndarray) -> pd.DataFrame:
+        result = self.cities.iloc[rows].copy()
+        result['daylight_hours'] = hours[rows]
+        sort_by = ['daylight_hours', 'population'] if 'population' in result.columns else ['daylight_hours']
+        return result.sort_values(sort_by, ascending=False)
+
+    def at_least(self, target_date: date, hours_threshold: float) -> pd.DataFrame:
+        """
+        All cities with at least hours_threshold hours of daylight on target_date
+        """
+        self.last_computed = 0
+        hours = np.full(len(self), np.nan)
+        rows = self._rows(self._band(target_date, hours_threshold))
+        self._compute(target_date, rows, hours)
+        rows = rows[hours[rows] >= hours_threshold]
+        logger.info(f"Threshold query computed {self.last_computed} of {len(self)} cities")
+        return self._result(rows, hours)
+
+    def top_n(self, target_date: date, n: int = 20) -> pd.DataFrame:
+        """
+        The n cities with the most daylight on target_date (ties broken by population)
+        """
+        self.last_computed = 0
+        hours = np.full(len(self), np.nan)
+        if len(self) == 0 or n <= 0:
+            return self._result(np.empty(0, dtype=np.int64), hours)
+
+        # Highest threshold whose band still holds n cities: binary search over envelope levels
+        levels = np.unique(self._cell_upper_bounds(target_date))
+        lo, hi = 0, len(levels) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if sum(b - a for a, b in self._band(target_date, levels[mid])) >= n:
+                lo = mid
+            else:
+                hi = mid - 1
+        threshold = levels[lo]
+
+        # Verify: every city outside the band has < threshold hours, so the band's n-th best
+        # is exact once it reaches the threshold; otherwise lower the threshold to it and widen
+        while True:
+            rows = self._rows(self._band(target_date, threshold))
+            self._compute(target_date, rows, hours)
+            nth_best = np.sort(hours[rows])[-min(n, len(rows))]
+            if nth_best >= threshold or len(rows) == len(self):
+                break
+            threshold = nth_best
+
+        rows = rows[hours[rows] >= nth_best]
+        logger.info(f"Top-{n} query computed {self.last_computed} of {len(self)} cities")
+        return self._result(rows, hours).head(n)
@@ -0,0 +1,84 @@
+"""
+Per-day daylight leaderboards over a date range, computed in one batch
+"""
+import logging
+from datetime import date
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+from .daylight_search import date_grid, _city_chunks
+from .solar_engine import event_minutes, day_length_from_events
+
+logger = logging.getLogger(__name__)
+
+ID_COLUMNS = ['geonameid', 'id', 'name']
+
+
+def _ranking_keys(hours: np.ndarray, population_rank: np.ndarray, n_cities: int) -> np.ndarray:
+    """
+    Sort keys ordering by day length (to the microhour) and then by population, so ties
+    such as runs of 24h polar days resolve like rank_cities_by_daylight
+    """
+    return np.round(hours, 6) + population_rank / max(n_cities, 1) * 1e-7
+
+
+def _top_k(keys: np.ndarray, k: int) -> np.ndarray:
+    """
+    Column indices of the k largest keys per row, unordered (partial selection)
+    """
+    if keys.shape[1] <= k:
+        return np.broadcast_to(np.arange(keys.shape[1]), keys.shape).copy()
+    return np.argpartition(keys, -k, axis=1)[:, -k:]
+
+
+def daily_leaderboard(cities_df: pd.DataFrame, start: date, end: date, k: int = 10,
+                      id_column: Optional[str] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Top k cities by daylight for every date in [start, end].
+
+    Returns (ids, hours): two days x k frames indexed by date with columns 1..k, holding
+    the city id (id_column, default geonameid/id/name) and its day length in hours.
+    """
+    id_column = id_column or next(c for c in ID_COLUMNS if c in cities_df.columns)
+    days = date_grid(start, end)
+    n = len(cities_df)
+    population = cities_df['population'].to_numpy() if 'population' in cities_df.columns else np.zeros(n)
+    population_rank = np.empty(n)
+    population_rank[np.argsort(population, kind='stable')] = np.arange(n)
+
+    best_rows = np.empty((len(days), 0), dtype=np.int64)
+    best_keys = np.empty((len(days), 0))
+    best_hours = np.empty((len(days), 0))
+
+    for rows, chunk in _city_chunks(cities_df):
+        hours = day_length_from_events(event_minutes(chunk['latitude'], chunk['longitude'], days))
+        keys = _ranking_keys(hours, population_rank[rows], n)
+        pick = _top_k(keys, k)
+        # Merge this chunk's candidates with the running best, keeping k per day
+        best_rows = np.concatenate([best_rows, pick + rows.start], axis=1)
+        best_keys = np.concatenate([best_keys, np.take_along_axis(keys, pick, axis=1)], axis=1)
+        best_hours = np.concatenate([best_hours, np.take_along_axis(hours, pick, axis=1)], axis=1)
+        keep = _top_k(best_keys, k)
+        best_rows, best_keys, best_hours = (np.take_along_axis(a, keep, axis=1)
+                                            for a in (best_rows, best_keys, best_hours))
+
+    order = np.argsort(-best_keys, axis=1, kind='stable')
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    best_hours = np.take_along_axis(best_hours, order, axis=1)
+
+    index = pd.Index(pd.to_datetime(days).date, name='date')
+    columns = range(1, best_rows.shape[1] + 1)
+    ids = pd.DataFrame(cities_df[id_column].to_numpy()[best_rows], index=index, columns=columns)
+    values = pd.DataFrame(best_hours, index=index, columns=columns)
+    logger.info(f"Built {len(days)}-day top-{k} leaderboard over {n} cities")
+    return ids, values
+
+
+def leaderboard_frame(ids: pd.DataFrame, hours: pd.DataFrame) -> pd.DataFrame:
+    """
+    Long format (date, rank, city, daylight_hours) for publishing
+    """
+    long = ids.stack().rename('city').to_frame()
+    long['daylight_hours'] = hours.stack()
+    long.index.names = ['date', 'rank']
+    return long.reset_index()
@@ -0,0 +1,100 @@
+"""
+Streaming output: write result batches as they are produced with constant memory
+"""
+import gzip
+import io
+import logging
+import sys
+from typing import Iterable, List, Optional, Union
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'jsonl')
+COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+def infer_format(path: str) -> tuple:
+    """
+    (format, compression) from a path like out.csv, out.jsonl.gz or out.csv.zst
+    """
+    compression = None
+    for suffix, name in COMPRESSIONS.items():
+        if path.endswith(suffix):
+            compression = name
+            path = path[:-len(suffix)]
+    fmt = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+    return fmt, compression
+
+
+class StreamingWriter:
+    """
+    Append DataFrame batches to CSV or JSON Lines, optionally gzip/zstd compressed.
+    The path '-' writes to stdout for piping. Columns are fixed by the first batch.
+    """
+
+    def __init__(self, path: str, fmt: Optional[str] = None, compression: Optional[str] = None):
+        inferred_fmt, inferred_compression = infer_format(path)
+        self.path = path
+        self.fmt = fmt or inferred_fmt
+        self.compression = compression if compression is not None else inferred_compression
+        if self.fmt not in FORMATS:
+            raise ValueError(f"Unsupported output format {self.fmt!r}, use one of {FORMATS}")
+
+        self.columns: Optional[List[str]] = None
+        self.rows_written = 0
+        self._raw = None
+        self._handle = self._open()
+
+    def _open(self):
+        if self.path == '-':
+            return sys.stdout
+        if self.compression == 'gzip':
+            return gzip.open(self.path, 'wt', newline='', encoding='utf-8')
+        if self.compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("zstandard is required for .zst output (pip install zstandard)")
+            self._raw = open(self.path, 'wb')
+            stream = zstandard.ZstdCompressor().stream_writer(self._raw)
+            return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        return open(self.path, 'w', newline='', encoding='utf-8')
+
+    def write(self, batch: Union[pd.DataFrame, Iterable[dict]]):
+        """
+        Write one batch of rows
+        """
+        if not isinstance(batch, pd.DataFrame):
+            batch = pd.DataFrame(list(batch))
+        if batch.empty:
+            return
+        if self.columns is None:
+            self.columns = list(batch.columns)
+        else:
+            batch = batch.reindex(columns=self.columns)
+
+        if self.fmt == 'csv':
+            batch.to_csv(self._handle, header=self.rows_written == 0, index=False)
+        else:
+            text = batch.to_json(orient='records', lines=True, date_format='iso', force_ascii=False)
+            self._handle.write(text if text.endswith('\n') else text + '\n')
+        self.rows_written += len(batch)
+
+    def close(self):
+        if self._handle is None:
+            return
+        if self._handle is sys.stdout:
+            self._handle.flush()
+        else:
+            self._handle.close()
+            if self._raw is not None and not self._raw.closed:
+                self._raw.close()
+        self._handle = None
+        logger.info(f"Wrote {self.rows_written} rows to {'stdout' if self.path == '-' else self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,243 @@
+"""
+Lazy daylight queries: DaylightQuery().cities(...).where(...).on(date).top(n) records a
+plan, then collect() pushes filters below the sun computation, prunes result columns
+and picks the cheapest engine (ranking cache, day-length table, vectorized batch, API)
+"""
+import copy
+import logging
+import re
+from datetime import date
+from typing import List, Optional, Tuple, Union
+import pandas as pd
+from .city_filter import CityFilter
+from .city_processor import CityDataProcessor
+from .latitude_index import LatitudeIndex
+from .ranking_cache import RankingCache, dataset_version
+from .result_schema import DAY_LENGTH_COLUMN, TIME_COLUMNS, daylight_hours
+from .solar_engine import SUNRISE_ELEVATION, crossing_minutes, hours_above
+
+logger = logging.getLogger(__name__)
+
+ENGINES = ('auto', 'table', 'vectorized', 'api')
+HEMISPHERES = {'north': (0.0, 90.0), 'south': (-90.0, 0.0)}
+# Columns that only exist after the sun computation
+RESULT_COLUMNS = set(TIME_COLUMNS) | {DAY_LENGTH_COLUMN, 'daylight_hours', 'calculation_date', 'data_source',
+                                      'timezone'}
+# Result columns the day-length table engine can produce without event times
+TABLE_COLUMNS = {DAY_LENGTH_COLUMN, 'daylight_hours'}
+
+_IDENTIFIER = re.compile(r'`([^`]+)`|(?<![@\w.])([A-Za-z_]\w*)')
+
+
+def referenced_columns(expression: str) -> set:
+    """
+    Names an expression for DataFrame.query may refer to (bare or `backticked`, not @locals)
+    """
+    return {quoted or bare for quoted, bare in _IDENTIFIER.findall(expression)}
+
+
+class DaylightQuery:
+    """
+    Immutable query plan; every builder method returns a new query, nothing runs until collect()
+    """
+
+    def __init__(self, processor: Optional[CityDataProcessor] = None):
+        self.processor = processor
+        self._source: Union[None, str, pd.DataFrame] = None
+        self._filter = CityFilter()
+        self._expressions: List[str] = []
+        self._date: Optional[date] = None
+        self._top: Optional[int] = None
+        self._columns: Optional[List[str]] = None
+        self._engine = 'auto'
+
+    def _copy(self) -> 'DaylightQuery':
+        query = copy.copy(self)
+        query._expressions = list(self._expressions)
+        return query
+
+    def cities(self, source: Union[None, str, pd.DataFrame] = None, min_population: int = 0) -> 'DaylightQuery':
+        """
+        Scan the sample cities (None), a CSV/Parquet file, a GeoNames .txt/.zip dump or a frame
+        """
+        query = self._copy()
+        query._source = source
+        query._filter = query._filter.with_min_population(min_population)
+        return query
+
+    def where(self, expression: Optional[str] = None, *, min_population: int = 0,
+              countries=None, lat_range: Optional[Tuple[float, float]] = None,
+              bbox: Optional[Tuple[float, float, float, float]] = None,
+              hemisphere: Optional[str] = None) -> 'DaylightQuery':
+        """
+        Add filters. Keyword filters go into the loader; a DataFrame.query expression runs
+        before the computation unless it refers to result columns (daylight_hours, sunrise, ...).
+        """
+        query = self._copy()
+        current = query._filter
+        if countries is not None and current.countries is not None:
+            countries = current.countries & set(countries)
+        if hemisphere is not None:
+            if hemisphere not in HEMISPHERES:
+                raise ValueError(f"hemisphere must be one of {sorted(HEMISPHERES)}, got {hemisphere!r}")
+            lat_range = _intersect(lat_range, HEMISPHERES[hemisphere])
+        if bbox is not None and current.bbox is not None:
+            raise ValueError("A query takes at most one bounding box")
+        query._filter = CityFilter(max(current.min_population, min_population or 0),
+                                   current.countries if countries is None else countries,
+                                   _intersect(current.lat_range, lat_range),
+                                   current.bbox if bbox is None else bbox)
+        if expression:
+            query._expressions.append(expression)
+        return query
+
+    def on(self, target_date: date) -> 'DaylightQuery':
+        query = self._copy()
+        query._date = target_date
+        return query
+
+    def top(self, n: int) -> 'DaylightQuery':
+        """
+        Keep the n cities with the most daylight (ties broken by population)
+        """
+        query = self._copy()
+        query._top = n
+        return query
+
+    def select(self, *columns: str) -> 'DaylightQuery':
+        query = self._copy()
+        query._columns = list(columns)
+        return query
+
+    def engine(self, name: str) -> 'DaylightQuery':
+        if name not in ENGINES:
+            raise ValueError(f"engine must be one of {ENGINES}, got {name!r}")
+        query = self._copy()
+        query._engine = name
+        return query
+
+    def _split_expressions(self) -> Tuple[List[str], List[str]]:
+        """
+        (expressions over input columns, expressions over result columns)
+        """
+        before, after = [], []
+        for expression in self._expressions:
+            (after if referenced_columns(expression) & RESULT_COLUMNS else before).append(expression)
+        return before, after
+
+    def _needed_results(self, after: List[str]) -> set:
+        if self._columns is None:
+            return set(RESULT_COLUMNS)
+        needed = set(self._columns) & RESULT_COLUMNS
+        for expression in after:
+            needed |= referenced_columns(expression) & RESULT_COLUMNS
+        if self._top:
+            needed.add('daylight_hours')
+        return needed
+
+    def _choose_engine(self, after: List[str]) -> str:
+        if self._engine != 'auto':
+            return self._engine
+        return 'table' if self._needed_results(after) <= TABLE_COLUMNS else 'vectorized'
+
+    def _cacheable(self, after: List[str], engine: str) -> bool:
+        # Cached rankings hold every result column of an unfiltered top N
+        return bool(self._top) and not after and engine != 'table'
+
+    def explain(self) -> str:
+        before, after = self._split_expressions()
+        engine = self._choose_engine(after)
+        source = 'sample cities' if self._source is None else (
+            'DataFrame' if isinstance(self._source, pd.DataFrame) else self._source)
+        lines = [f"scan {source} [pushed: {self._filter.cache_key()}]"]
+        lines += [f"filter {expression}" for expression in before]
+        if self._cacheable(after, engine):
+            lines.append("ranking cache lookup")
+        pruning = " with latitude-band pruning" if self._top and not after and engine != 'api' else ""
+        lines.append(f"compute {engine} on {self._date or 'today'}{pruning}")
+        lines += [f"filter {expression}" for expression in after]
+        if self._top:
+            lines.append(f"top {self._top} by daylight_hours, population")
+        if self._columns is not None:
+            lines.append(f"project {', '.join(self._columns)}")
+        return '\n'.join(lines)
+
+    def _load(self, processor: CityDataProcessor) -> pd.DataFrame:
+        source = self._source
+        if source is None:
+            return processor.load_sample_cities(0, self._filter)
+        if isinstance(source, pd.DataFrame):
+            return self._filter.apply(source)
+        if source.endswith(('.txt', '.zip')):
+            return processor.data_fetcher.load_geonames_dump(source, city_filter=self._filter)
+        return processor.data_fetcher.load_cities_from_csv(source, city_filter=self._filter)
+
+    def _table(self, cities_df: pd.DataFrame, target_date: date, prune: bool) -> pd.DataFrame:
+        """
+        Day length only: the sunrise/sunset crossing without twilight or event times,
+        for just the latitude band that can reach the top when ranking
+        """
+        if prune:
+            cities_df = cities_df.loc[LatitudeIndex(cities_df).top_n(target_date, self._top).index]
+        result = cities_df.copy()
+        if len(result):
+            crossings = crossing_minutes(result['latitude'], result['longitude'], [target_date], [SUNRISE_ELEVATION])
+            result['daylight_hours'] = hours_above(crossings)[0, 0]
+        else:
+            result['daylight_hours'] = pd.Series(dtype=float)
+        result[DAY_LENGTH_COLUMN] = result['daylight_hours'] * 3600.0
+        return result
+
+    def collect(self, use_cache: bool = True) -> pd.DataFrame:
+        """
+        Execute the plan once and return the result frame
+        """
+        processor = self.processor or CityDataProcessor()
+        target_date = self._date or date.today()
+        before, after = self._split_expressions()
+        engine = self._choose_engine(after)
+        logger.info(f"Query plan:\n{self.explain()}")
+
+        cities_df = self._load(processor)
+        for expression in before:
+            cities_df = cities_df.query(expression)
+
+        cache_key = None
+        if use_cache and self._cacheable(after, engine):
+            filter_key = ';'.join([self._filter.cache_key()] + before)
+            cache_key = RankingCache.key(target_date, filter_key, engine == 'api', dataset_version(cities_df))
+            cached = processor.ranking_cache.get(cache_key, self._top)
+            if cached is not None:
+                return self._project(cached)
+
+        prune = bool(self._top) and not after
+        if engine == 'table':
+            result = self._table(cities_df, target_date, prune)
+        else:
+            if prune and engine == 'vectorized':
+                cities_df = cities_df.loc[LatitudeIndex(cities_df).top_n(target_date, self._top).index]
+            result = processor.add_sunrise_sunset_data(cities_df, target_date, use_api=engine == 'api')
+            result['daylight_hours'] = daylight_hours(result)
+
+        for expression in after:
+            result = result.query(expression)
+        if self._top:
+            result = processor.rank_cities_by_daylight(result, self._top)
+            if cache_key:
+                # Refused when API rows fell back to local or lack a day length
+                processor.ranking_cache.put(cache_key, self._top, result, use_api=engine == 'api')
+        return self._project(result)
+
+    def _project(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self._columns is None:
+            return df
+        missing = [c for c in self._columns if c not in df.columns]
+        if missing:
+            raise KeyError(f"Unknown query columns: {missing}")
+        return df[self._columns]
+
+
+def _intersect(a: Optional[Tuple[float, float]], b: Optional[Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    if a is None or b is None:
+        return a if b is None else b
+    return max(a[0], b[0]), min(a[1], b[1])
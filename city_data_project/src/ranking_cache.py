@@ -0,0 +1,149 @@
+"""
+Cache of ranked daylight results keyed by (date, city filter, data source, engine,
+dataset version); an answer for top N also serves every smaller N
+"""
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Optional, Tuple
+import pandas as pd
+from .config import RANKING_CACHE_DIR, RANKING_CACHE_ENTRIES
+from .ephemeris import EPHEMERIS_MODEL
+from .result_schema import DAY_LENGTH_COLUMN, SCHEMA_VERSION
+from .solar_engine import ENGINE_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Columns that identify a city's inputs; any change to them changes the dataset version
+DATASET_COLUMNS = ['name', 'country', 'latitude', 'longitude', 'population']
+
+
+def dataset_version(cities_df: pd.DataFrame) -> str:
+    """
+    Content hash of the city table (row order included), so edited or reloaded data
+    never hits rankings computed from older data
+    """
+    columns = [c for c in DATASET_COLUMNS if c in cities_df.columns]
+    hashes = pd.util.hash_pandas_object(cities_df[columns], index=False)
+    return hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()[:16]
+
+
+def engine_version() -> str:
+    return f"{ENGINE_VERSION}/{EPHEMERIS_MODEL}/{SCHEMA_VERSION}"
+
+
+def is_complete(ranked: pd.DataFrame, use_api: bool) -> bool:
+    """
+    Whether every row has a day length and (when recorded) came from the requested source,
+    so rankings degraded by API fallbacks or a run deadline are never cached as API answers
+    """
+    if DAY_LENGTH_COLUMN not in ranked.columns or ranked[DAY_LENGTH_COLUMN].isna().any():
+        return False
+    expected = 'api' if use_api else 'local'
+    return 'data_source' not in ranked.columns or bool((ranked['data_source'] == expected).all())
+
+
+class RankingCache:
+    """
+    In-memory LRU of ranked frames, backed by one JSON file (pandas table schema, so
+    dtypes survive) per entry in cache_dir so repeat queries from later runs are also
+    served without compute. Plain JSON keeps loading files from a shared directory safe.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = RANKING_CACHE_DIR, max_entries: int = RANKING_CACHE_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Tuple[int, pd.DataFrame]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def key(target_date: date, filter_key: str, use_api: bool, version: str) -> str:
+        parts = {'date': str(target_date), 'filter': filter_key, 'source': 'api' if use_api else 'local',
+                 'engine': engine_version(), 'dataset': version}
+        return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:20]
+
+    def _path(self, key: str, top_n: int) -> str:
+        return os.path.join(self.cache_dir, f"{key}-top{top_n}.json")
+
+    def _load(self, key: str, top_n: int) -> Optional[Tuple[int, pd.DataFrame]]:
+        """
+        Smallest persisted entry for key that covers top_n
+        """
+        if not self.cache_dir:
+            return None
+        sizes = []
+        for path in glob.glob(os.path.join(self.cache_dir, f"{key}-top*.json")):
+            try:
+                sizes.append(int(path[:-len('.json')].rsplit('-top', 1)[1]))
+            except ValueError:
+                continue
+        for n in sorted(n for n in sizes if n >= top_n):
+            try:
+                with open(self._path(key, n), encoding='utf-8') as f:
+                    return n, pd.read_json(io.StringIO(f.read()), orient='table')
+            except Exception as e:
+                logger.warning(f"Could not read cached ranking {self._path(key, n)}: {e}")
+        return None
+
+    def get(self, key: str, top_n: int) -> Optional[pd.DataFrame]:
+        """
+        Top top_n rows for key if a cached ranking of at least that size exists
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < top_n:
+                loaded = self._load(key, top_n)
+                if loaded is not None:
+                    entry = loaded
+                    self._remember(key, *entry)
+            if entry is None or entry[0] < top_n:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            logger.info(f"Ranking cache hit: top {top_n} served from cached top {entry[0]}")
+            return entry[1].head(top_n).copy()
+
+    def _remember(self, key: str, top_n: int, ranked: pd.DataFrame):
+        current = self._entries.get(key)
+        if current is None or current[0] < top_n:
+            self._entries[key] = (top_n, ranked)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key: str, top_n: int, ranked: pd.DataFrame, use_api: bool = False):
+        """
+        Store a ranking of the top top_n rows (fewer when the table is smaller), unless
+        it is incomplete or mixes sources (see is_complete)
+        """
+        if not is_complete(ranked, use_api):
+            logger.info("Not caching ranking: rows are missing day lengths or came from a fallback source")
+            return
+        with self._lock:
+            self._remember(key, top_n, ranked.copy())
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(key, top_n)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(ranked.to_json(orient='table', date_unit='ns'))
+            os.replace(tmp_path, path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not write ranking cache entry: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir:
+            for path in glob.glob(os.path.join(self.cache_dir, '*.json')):
+                os.remove(path)
@@ -0,0 +1,98 @@
+"""
+Token-bucket rate limiter shared by every thread and process on one host: bucket state
+lives in a small file updated under an exclusive file lock
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict
+from .config import RATE_LIMIT, RATE_LIMIT_BURST, RATE_LIMIT_STATE_FILE
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to limiting within this process only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SharedRateLimiter:
+    """
+    One bucket per key (API host) refilled at rate tokens per second up to burst.
+    A caller takes a token under the lock; when none is left it still takes one (the
+    bucket goes negative, reserving a future slot) and sleeps outside the lock, so
+    waiters queue in arrival order across processes.
+    """
+
+    def __init__(self, rate: float = RATE_LIMIT, burst: float = RATE_LIMIT_BURST,
+                 state_file: str = RATE_LIMIT_STATE_FILE):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.state_file = state_file
+        self._thread_lock = threading.Lock()
+        self._local_state: Dict[str, Dict[str, float]] = {}
+        self.stats = {'acquired': 0, 'waited': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0}
+        if fcntl is None:
+            logger.warning("fcntl unavailable; rate limit is only shared within this process")
+
+    def _reserve(self, state: Dict[str, Dict[str, float]], key: str) -> float:
+        # Wall-clock time, since monotonic clocks are not comparable across processes
+        now = time.time()
+        bucket = state.get(key, {'tokens': self.burst, 'updated': now})
+        tokens = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * self.rate)
+        tokens -= 1
+        state[key] = {'tokens': tokens, 'updated': now}
+        return -tokens / self.rate if tokens < 0 else 0.0
+
+    def _reserve_shared(self, key: str) -> float:
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+        with open(self.state_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    logger.warning(f"Resetting unreadable rate limit state in {self.state_file}")
+                    state = {}
+                wait = self._reserve(state, key)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return wait
+
+    def acquire(self, key: str = 'default') -> float:
+        """
+        Block until a request to key may be made; returns the seconds spent waiting
+        """
+        if not self.rate:
+            return 0.0
+        with self._thread_lock:
+            if fcntl is None:
+                wait = self._reserve(self._local_state, key)
+            else:
+                try:
+                    wait = self._reserve_shared(key)
+                except OSError as e:
+                    logger.warning(f"Shared rate limit state unavailable ({e}); limiting in-process")
+                    wait = self._reserve(self._local_state, key)
+            self.stats['acquired'] += 1
+            if wait > 0:
+                self.stats['waited'] += 1
+                self.stats['wait_seconds'] += wait
+                self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def summary(self) -> str:
+        acquired = self.stats['acquired']
+        mean = self.stats['wait_seconds'] / acquired if acquired else 0.0
+        return (f"{acquired} requests, {self.stats['waited']} waited, "
+                f"{self.stats['wait_seconds']:.1f}s total wait (mean {mean:.2f}s, "
+                f"max {self.stats['max_wait_seconds']:.2f}s)")
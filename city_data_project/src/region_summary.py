@@ -0,0 +1,93 @@
+"""
+Region reports over ranked result tables: daylight for every city in one vectorized
+pass, a precomputed global rank, a country to region column, and one grouped pass for
+per-group counts and top-K rows
+"""
+import logging
+from datetime import date
+from typing import Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+from .result_schema import add_result_columns
+from .solar_engine import (event_minutes, day_length_from_events, minutes_to_datetime64,
+                           NORMAL, ALWAYS_ABOVE, ALWAYS_BELOW)
+
+logger = logging.getLogger(__name__)
+
+STATUS_LABELS = {NORMAL: 'success', ALWAYS_ABOVE: 'polar_day', ALWAYS_BELOW: 'polar_night'}
+
+
+def daylight_durations(cities_df: pd.DataFrame, target_date: date) -> pd.DataFrame:
+    """
+    Copy of cities_df with UTC sunrise/sunset (NaT for polar day/night), daylight_hours,
+    day_length in seconds and status ('success', 'polar_day', 'polar_night') for each
+    city's local solar day
+    """
+    result = cities_df.copy()
+    if len(result) == 0:
+        return add_result_columns(result, ['sunrise', 'sunset']).assign(daylight_hours=np.nan, status=None)
+
+    events = event_minutes(result['latitude'], result['longitude'], [target_date])
+    for column, key in (('sunrise', 'rise'), ('sunset', 'set')):
+        times = minutes_to_datetime64([target_date], events[key])[0]
+        result[column] = pd.Series(times, index=result.index).dt.tz_localize('UTC')
+    hours = day_length_from_events(events)[0]
+    result['daylight_hours'] = hours
+    result['day_length'] = hours * 3600.0
+    status = events['status'][0]
+    result['status'] = pd.Series(status, index=result.index).map(STATUS_LABELS)
+    polar = int((status != NORMAL).sum())
+    if polar:
+        logger.info(f"No sunrise/sunset on {target_date} for {polar} of {len(result)} cities (polar day/night)")
+    return result
+
+
+def add_rank(df: pd.DataFrame, column: str = 'rank') -> pd.DataFrame:
+    """
+    Global 1-based rank in the frame's current (already sorted) order
+    """
+    df = df.copy()
+    df[column] = range(1, len(df) + 1)
+    return df
+
+
+def add_region(df: pd.DataFrame, regions: Dict[str, Iterable[str]], column: str = 'region',
+               other: Optional[str] = None, country_column: str = 'country') -> pd.DataFrame:
+    """
+    Map each row's country to its region with one dictionary lookup per distinct country;
+    countries in no region get other (None leaves them out of region groups)
+    """
+    lookup = {country: region for region, countries in regions.items() for country in countries}
+    df = df.copy()
+    df[column] = df[country_column].map(lookup)
+    if other is not None:
+        df[column] = df[column].fillna(other)
+    return df
+
+
+class GroupSummary:
+    """
+    Count and top rows of one group
+    """
+
+    def __init__(self, name: str, count: int, top: pd.DataFrame):
+        self.name = name
+        self.count = count
+        self.top = top
+
+    def __repr__(self) -> str:
+        return f"GroupSummary({self.name!r}, count={self.count}, top={len(self.top)})"
+
+
+def summarize_groups(df: pd.DataFrame, by: str, top_k: Optional[int] = 5) -> Dict[str, GroupSummary]:
+    """
+    Per-group counts and top_k rows (all rows when top_k is None) in the frame's order,
+    keyed by group in order of first appearance (so the group holding the best row comes first)
+    """
+    groups = df.groupby(by, sort=False, observed=True)
+    counts = groups.size()
+    top = groups.head(top_k) if top_k else df
+    return {
+        name: GroupSummary(name, int(counts[name]), rows)
+        for name, rows in top.groupby(by, sort=False, observed=True)
+    }
@@ -0,0 +1,122 @@
+"""
+Typed sunrise/sunset result columns shared by every engine: event times are
+datetime64[ns, UTC] and day length is float seconds. Strings are only produced
+by format_for_display at output time.
+"""
+import logging
+from typing import Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+from .timezones import localize_times
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever stored result types change, so cached outputs are not reused across schemas
+SCHEMA_VERSION = "2"
+
+TIME_COLUMNS = [
+    'sunrise', 'sunset', 'solar_noon',
+    'civil_twilight_begin', 'civil_twilight_end',
+    'nautical_twilight_begin', 'nautical_twilight_end',
+    'astronomical_twilight_begin', 'astronomical_twilight_end',
+]
+DAY_LENGTH_COLUMN = 'day_length'
+UTC_DTYPE = pd.DatetimeTZDtype('ns', 'UTC')
+
+
+def time_columns(df: pd.DataFrame) -> list:
+    """
+    Event time columns present in df, including extra elevation crossings (*_begin/*_end)
+    """
+    return [c for c in df.columns if c in TIME_COLUMNS or c.endswith(('_begin', '_end'))]
+
+
+def add_result_columns(df: pd.DataFrame, columns: Iterable[str] = TIME_COLUMNS) -> pd.DataFrame:
+    """
+    Add empty typed result columns (NaT times, NaN day length)
+    """
+    for col in columns:
+        df[col] = pd.Series(pd.NaT, index=df.index, dtype=UTC_DTYPE)
+    df[DAY_LENGTH_COLUMN] = np.nan
+    return df
+
+
+def day_length_seconds(values) -> pd.Series:
+    """
+    Day length in seconds from numbers (already seconds, as the API returns them),
+    timedeltas or legacy "H:MM:SS" strings, in one vectorized pass; unparseable values are NaN
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    if pd.api.types.is_timedelta64_dtype(values):
+        return values.dt.total_seconds()
+    numeric = pd.to_numeric(values, errors='coerce')
+    text = values.where(numeric.isna()).astype(object)
+    text = text.where(text.str.count(':') != 1, text + ':00')  # H:MM
+    parsed = pd.to_timedelta(text, errors='coerce').dt.total_seconds()
+    return numeric.fillna(parsed).astype(float)
+
+
+def daylight_hours(df: pd.DataFrame) -> pd.Series:
+    """
+    Decimal daylight hours per row (0.0 where the day length is missing)
+    """
+    return (day_length_seconds(df[DAY_LENGTH_COLUMN]) / 3600.0).fillna(0.0).set_axis(df.index)
+
+
+def coerce_results(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bring result columns read back from files (strings) to the typed schema
+    """
+    for col in time_columns(df):
+        if not isinstance(df[col].dtype, pd.DatetimeTZDtype):
+            df[col] = pd.to_datetime(df[col], utc=True, errors='coerce', format='mixed')
+        elif df[col].dt.tz is not None and str(df[col].dt.tz) != 'UTC':
+            df[col] = df[col].dt.tz_convert('UTC')
+    if DAY_LENGTH_COLUMN in df.columns:
+        df[DAY_LENGTH_COLUMN] = day_length_seconds(df[DAY_LENGTH_COLUMN]).set_axis(df.index)
+    return df
+
+
+def typed_record(record: Dict) -> Dict:
+    """
+    Typed values for one result dict (API response or per-city local fallback)
+    """
+    typed = {}
+    for key, value in record.items():
+        if key in TIME_COLUMNS:
+            typed[key] = pd.to_datetime(value, utc=True, errors='coerce') if value else pd.NaT
+        elif key == DAY_LENGTH_COLUMN:
+            typed[key] = day_length_seconds([value]).iloc[0] if value is not None else np.nan
+        else:
+            typed[key] = value
+    return typed
+
+
+def format_day_length(seconds) -> pd.Series:
+    """
+    Format day lengths in seconds as H:MM:SS strings without per-row formatting
+    """
+    seconds = pd.Series(np.rint(np.asarray(seconds, dtype=float))).astype('Int64')
+    return (
+        (seconds // 3600).astype(str) + ':'
+        + ((seconds % 3600) // 60).astype(str).str.zfill(2) + ':'
+        + (seconds % 60).astype(str).str.zfill(2)
+    )
+
+
+def format_for_display(df: pd.DataFrame, time_format: Optional[str] = '%Y-%m-%dT%H:%M:%S%z') -> pd.DataFrame:
+    """
+    Copy of df with event times as local clock strings (per the timezone column) and
+    day length as H:MM:SS; missing values stay empty
+    """
+    df = df.copy()
+    columns = time_columns(df)
+    df = localize_times(df, columns, fmt=time_format)
+    for col in columns:
+        df[col] = df[col].astype(object).where(df[col].notna(), None)
+    if DAY_LENGTH_COLUMN in df.columns and pd.api.types.is_numeric_dtype(df[DAY_LENGTH_COLUMN]):
+        formatted = format_day_length(df[DAY_LENGTH_COLUMN]).set_axis(df.index)
+        df[DAY_LENGTH_COLUMN] = formatted.astype(object).where(df[DAY_LENGTH_COLUMN].notna(), None)
+    return df
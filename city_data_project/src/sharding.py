@@ -0,0 +1,132 @@
+"""
+Deterministic sharding of the city table across machines and merging of shard outputs
+"""
+import heapq
+import logging
+import os
+from typing import Iterable, List, Optional, Tuple
+import pandas as pd
+from .output_writer import COMPRESSIONS, StreamingWriter
+from .result_schema import daylight_hours
+
+logger = logging.getLogger(__name__)
+
+# Columns used as the stable city id when the table has no id column of its own
+ID_COLUMNS = ['geonameid', 'id']
+KEY_COLUMNS = ['name', 'country', 'latitude', 'longitude']
+
+MERGE_CHUNK_ROWS = 100000
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Parse 'i/N' (0-based shard i of N)
+    """
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in [0, {count}), got {spec!r}")
+    return index, count
+
+
+def shard_tag(index: int, count: int) -> str:
+    return f"{index}/{count}"
+
+
+def split_extension(filename: str) -> Tuple[str, str]:
+    """
+    ('cities', '.jsonl.gz') for cities.jsonl.gz, keeping the compression suffix with the format
+    """
+    stem, ext = os.path.splitext(filename)
+    if ext in COMPRESSIONS:
+        stem, inner = os.path.splitext(stem)
+        ext = inner + ext
+    return stem, ext
+
+
+def shard_filename(filename: str, index: int, count: int) -> str:
+    """
+    cities.csv -> cities.shard-02-of-16.csv
+    """
+    stem, ext = split_extension(filename)
+    width = len(str(count - 1))
+    return f"{stem}.shard-{index:0{width}d}-of-{count}{ext or '.csv'}"
+
+
+def ranking_filename(filename: str, top_n: int) -> str:
+    """
+    merged.csv -> merged_top_20.csv
+    """
+    stem, ext = split_extension(filename)
+    return f"{stem}_top_{top_n}{ext or '.csv'}"
+
+
+def city_hashes(cities_df: pd.DataFrame) -> pd.Series:
+    """
+    Stable 64-bit hash of each city's id, identical on every machine and run
+    """
+    id_column = next((c for c in ID_COLUMNS if c in cities_df.columns), None)
+    if id_column:
+        key = cities_df[[id_column]].astype(str)
+    else:
+        key = cities_df[[c for c in KEY_COLUMNS if c in cities_df.columns]].copy()
+        for c in ('latitude', 'longitude'):
+            if c in key.columns:
+                key[c] = key[c].round(4)
+    return pd.util.hash_pandas_object(key, index=False)
+
+
+def select_shard(cities_df: pd.DataFrame, index: int, count: int) -> pd.DataFrame:
+    """
+    Rows of cities_df that belong to shard index of count
+    """
+    mask = (city_hashes(cities_df) % count == index).to_numpy()
+    shard_df = cities_df[mask].copy()
+    logger.info(f"Shard {shard_tag(index, count)}: {len(shard_df)} of {len(cities_df)} cities")
+    return shard_df
+
+
+def _daylight_hours(chunk: pd.DataFrame) -> pd.Series:
+    if 'daylight_hours' in chunk.columns:
+        return chunk['daylight_hours'].fillna(0.0)
+    return daylight_hours(chunk)
+
+
+def merge_partials(paths: Iterable[str], output_path: str,
+                   top_n: Optional[int] = 20, chunksize: int = MERGE_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Stream shard outputs into one file at output_path (CSV, JSON Lines or '-' for stdout,
+    as for StreamingWriter) and recompute the global daylight
+    ranking (daylight hours, then population, like rank_cities_by_daylight). Only one chunk
+    plus the current top N rows are held in memory. Returns the top N rows.
+    """
+    paths = list(paths)
+    columns: List[str] = []
+    candidates = []
+    sequence = 0
+
+    with StreamingWriter(output_path) as out:
+        for path in paths:
+            rows = 0
+            for chunk in pd.read_csv(path, chunksize=chunksize):
+                if not columns:
+                    columns = list(chunk.columns)
+                chunk = chunk.reindex(columns=columns + [c for c in chunk.columns if c not in columns])
+                chunk['daylight_hours'] = _daylight_hours(chunk)
+                if 'daylight_hours' not in columns:
+                    columns.append('daylight_hours')
+                out.write(chunk[columns])
+                rows += len(chunk)
+
+                if top_n:
+                    best = chunk.nlargest(top_n, ['daylight_hours', 'population'], keep='first')
+                    for position, record in zip(best.index - chunk.index[0], best.to_dict('records')):
+                        candidates.append((record['daylight_hours'], record['population'], -(sequence + position), record))
+                    candidates = heapq.nlargest(top_n, candidates, key=lambda item: item[:3])
+                sequence += len(chunk)
+            logger.info(f"Merged {rows} rows from {path}")
+
+    logger.info(f"Merged {len(paths)} partial outputs into {output_path}")
+    return pd.DataFrame([item[3] for item in candidates], columns=columns or None)
@@ -0,0 +1,269 @@
+"""
+Vectorized NOAA solar equations (the model astral uses) for many cities and dates at once
+"""
+import logging
+from typing import Dict, Iterable, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Using 32 arc minutes as sun's apparent diameter, like astral
+SUN_APPARENT_RADIUS = 32.0 / (60.0 * 2.0)
+SUNRISE_ZENITH = 90.0 + SUN_APPARENT_RADIUS
+
+# Julian day of 1970-01-01T00:00 UTC
+UNIX_EPOCH_JD = 2440587.5
+J2000_JD = 2451545.0
+
+# Bump whenever a change alters computed times, so cached/incremental results are recomputed
+ENGINE_VERSION = "2"
+
+# Event status codes
+NORMAL = 0
+ALWAYS_ABOVE = 1   # sun never drops below the angle (polar day for sunrise/sunset)
+ALWAYS_BELOW = -1  # sun never reaches the angle (polar night for sunrise/sunset)
+
+# Standard twilight elevations (degrees, true altitude of the sun's centre); like astral
+# they are used without refraction. The sunrise elevation is defined below.
+TWILIGHT_ELEVATIONS = {'civil': -6.0, 'nautical': -12.0, 'astronomical': -18.0}
+
+
+def to_day_numbers(dates: Iterable) -> np.ndarray:
+    """
+    Convert dates (datetime.date, strings or datetime64) to datetime64[D]
+    """
+    return np.asarray(dates, dtype='datetime64[D]').reshape(-1)
+
+
+def julian_day(day_numbers: np.ndarray) -> np.ndarray:
+    """
+    Julian day at 00:00 UTC for datetime64[D] values
+    """
+    return day_numbers.astype('int64') + UNIX_EPOCH_JD
+
+
+def solar_terms(jd: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Solar declination (degrees) and equation of time (minutes) at the given Julian days
+    """
+    t = (np.asarray(jd, dtype=float) - J2000_JD) / 36525.0
+
+    l0 = np.mod(280.46646 + t * (36000.76983 + 0.0003032 * t), 360.0)
+    m = 357.52911 + t * (35999.05029 - 0.0001537 * t)
+    e = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+
+    mrad = np.radians(m)
+    c = (np.sin(mrad) * (1.914602 - t * (0.004817 + 0.000014 * t))
+         + np.sin(2 * mrad) * (0.019993 - 0.000101 * t)
+         + np.sin(3 * mrad) * 0.000289)
+    true_long = l0 + c
+
+    omega = np.radians(125.04 - 1934.136 * t)
+    apparent_long = true_long - 0.00569 - 0.00478 * np.sin(omega)
+
+    seconds = 21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))
+    obliquity = 23.0 + (26.0 + seconds / 60.0) / 60.0 + 0.00256 * np.cos(omega)
+
+    declination = np.degrees(np.arcsin(np.sin(np.radians(obliquity)) * np.sin(np.radians(apparent_long))))
+
+    y = np.tan(np.radians(obliquity) / 2.0) ** 2
+    l0rad = np.radians(l0)
+    eqtime = 4.0 * np.degrees(
+        y * np.sin(2 * l0rad)
+        - 2.0 * e * np.sin(mrad)
+        + 4.0 * e * y * np.sin(mrad) * np.cos(2 * l0rad)
+        - 0.5 * y * y * np.sin(4 * l0rad)
+        - 1.25 * e * e * np.sin(2 * mrad)
+    )
+    return declination, eqtime
+
+
+def refraction_at_zenith(zenith: np.ndarray) -> np.ndarray:
+    """
+    Atmospheric refraction in degrees for the given zenith angles (astral's piecewise model)
+    """
+    elevation = 90.0 - np.asarray(zenith, dtype=float)
+    te = np.tan(np.radians(elevation))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        high = 58.1 / te - 0.07 / te ** 3 + 0.000086 / te ** 5
+        low = 1735.0 + elevation * (-518.2 + elevation * (103.4 + elevation * (-12.79 + elevation * 0.711)))
+        below = -20.774 / te
+    correction = np.where(elevation > 5.0, high, np.where(elevation > -0.575, low, below))
+    return np.where(elevation >= 85.0, 0.0, correction) / 3600.0
+
+
+# Sunrise/sunset as astral defines them: SUNRISE_ZENITH plus refraction at that zenith,
+# about -0.789 degrees. Batch crossings and event_minutes both use this one definition.
+SUNRISE_ELEVATION = 90.0 - (SUNRISE_ZENITH + float(refraction_at_zenith(SUNRISE_ZENITH)))
+
+
+def _prepare(latitudes, longitudes, dates) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    lat = np.clip(np.asarray(latitudes, dtype=float).reshape(1, -1), -89.8, 89.8)
+    lng = np.asarray(longitudes, dtype=float).reshape(1, -1)
+    days = to_day_numbers(dates)
+    jd0 = julian_day(days).reshape(-1, 1)
+    return lat, lng, days, jd0
+
+
+def event_minutes(latitudes, longitudes, dates, zenith: float = SUNRISE_ZENITH,
+                  with_refraction: bool = True, iterations: int = 2) -> Dict[str, np.ndarray]:
+    """
+    Rising/setting times of the sun through a zenith angle for every (date, city) pair.
+
+    Times are minutes after 00:00 UTC of each date and belong to the solar day centred on
+    that date's local noon, so they may be negative or exceed 1440. Returned arrays have
+    shape (len(dates), len(cities)); rise/set are NaN where the sun never crosses the angle
+    and 'status' holds ALWAYS_ABOVE / ALWAYS_BELOW for those cells.
+    """
+    if with_refraction:
+        zenith = zenith + float(refraction_at_zenith(zenith))
+    crossings = crossing_minutes(latitudes, longitudes, dates, [90.0 - zenith], iterations=iterations)
+    return {'rise': crossings['rise'][0], 'set': crossings['set'][0],
+            'noon': crossings['noon'], 'status': crossings['status'][0]}
+
+
+def crossing_minutes(latitudes, longitudes, dates, elevations: Iterable[float],
+                     with_refraction: bool = False, iterations: int = 2) -> Dict[str, np.ndarray]:
+    """
+    Times the sun crosses each elevation angle (degrees, negative below the horizon),
+    computed for all angles in one pass.
+
+    The noon solar terms and the latitude factors of the hour-angle equation are shared by
+    every angle; each refinement step then looks up the solar terms for all angles at once.
+    rise/set/status have shape (len(elevations), len(dates), len(cities)), noon has shape
+    (len(dates), len(cities)). Times follow the conventions of event_minutes.
+
+    Solar terms come from the shared per-date ephemeris, so the per-city work is the
+    hour-angle equation plus an interpolation of the daily declination/equation of time.
+    """
+    from .ephemeris import get_ephemeris
+    terms_at = get_ephemeris().terms_at
+
+    lat, lng, _, jd0 = _prepare(latitudes, longitudes, dates)
+    zenith = 90.0 - np.asarray(list(elevations), dtype=float)
+    if with_refraction:
+        zenith = zenith + refraction_at_zenith(zenith)
+    cos_zenith = np.cos(np.radians(zenith)).reshape(-1, 1, 1)
+    sin_lat, cos_lat = np.sin(np.radians(lat)), np.cos(np.radians(lat))
+
+    transit = 720.0 - 4.0 * lng + np.zeros_like(jd0)
+    declination, eqtime_noon = terms_at(jd0 + transit / 1440.0)
+    noon = transit - eqtime_noon
+
+    # First pass: every angle shares the noon declination
+    decl = np.radians(declination)
+    cos_h_noon = (cos_zenith - sin_lat * np.sin(decl)) / (cos_lat * np.cos(decl))
+    h = np.degrees(np.arccos(np.clip(cos_h_noon, -1.0, 1.0)))
+
+    results = {'noon': noon}
+    for name, sign in (('rise', -1.0), ('set', 1.0)):
+        t = noon + sign * 4.0 * h
+        cos_h = cos_h_noon
+        for _ in range(iterations - 1):
+            declination, eqtime = terms_at(jd0 + t / 1440.0)
+            decl = np.radians(declination)
+            cos_h = (cos_zenith - sin_lat * np.sin(decl)) / (cos_lat * np.cos(decl))
+            t = transit - eqtime + sign * 4.0 * np.degrees(np.arccos(np.clip(cos_h, -1.0, 1.0)))
+        results[name] = np.where(np.abs(cos_h) > 1.0, np.nan, t)
+        results[name + '_cos_h'] = cos_h
+
+    # On the first/last day of a polar period only one side of noon crosses the angle;
+    # mirror it around noon. Otherwise cos(h) < -1 means always above, > 1 always below.
+    rise_cos_h, set_cos_h = results.pop('rise_cos_h'), results.pop('set_cos_h')
+    rise, sunset = results['rise'], results['set']
+    results['rise'] = np.where(np.isnan(rise), 2 * noon - sunset, rise)
+    results['set'] = np.where(np.isnan(sunset), 2 * noon - rise, sunset)
+
+    status = np.full(results['rise'].shape, NORMAL, dtype=np.int8)
+    never_crosses = np.isnan(results['rise'])
+    status[never_crosses & (rise_cos_h + set_cos_h < 0)] = ALWAYS_ABOVE
+    status[never_crosses & (rise_cos_h + set_cos_h >= 0)] = ALWAYS_BELOW
+    results['status'] = status
+    return results
+
+
+def hours_above(crossings: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Hours the sun spends above each angle, from the output of crossing_minutes
+    """
+    hours = (crossings['set'] - crossings['rise']) / 60.0
+    hours = np.where(crossings['status'] == ALWAYS_ABOVE, 24.0, hours)
+    return np.where(crossings['status'] == ALWAYS_BELOW, 0.0, hours)
+
+
+def hours_above_at_declination(latitudes, declinations, elevation: float = SUNRISE_ELEVATION) -> np.ndarray:
+    """
+    Hours the sun would spend above an elevation if its declination held still all day
+    (24 where it never sinks below, 0 where it never reaches it). Day length grows
+    monotonically with declination north of the equator and shrinks south of it.
+    Returned array has shape (len(declinations), len(latitudes)).
+    """
+    lat = np.radians(np.clip(np.asarray(latitudes, dtype=float).reshape(1, -1), -89.8, 89.8))
+    decl = np.radians(np.asarray(declinations, dtype=float).reshape(-1, 1))
+    cos_h = (np.cos(np.radians(90.0 - elevation)) - np.sin(lat) * np.sin(decl)) / (np.cos(lat) * np.cos(decl))
+    return np.degrees(np.arccos(np.clip(cos_h, -1.0, 1.0))) * 2.0 / 15.0
+
+
+def day_length_hours(latitudes, longitudes, dates, zenith: float = SUNRISE_ZENITH) -> np.ndarray:
+    """
+    Hours between sunrise and sunset, 24 for polar day and 0 for polar night
+    """
+    return day_length_from_events(event_minutes(latitudes, longitudes, dates, zenith))
+
+
+def day_length_from_events(events: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Day length in hours from the output of event_minutes
+    """
+    return hours_above(events)
+
+
+def minutes_to_datetime64(dates, minutes: np.ndarray) -> np.ndarray:
+    """
+    Turn minutes after 00:00 UTC of each date into datetime64[ns] (NaT where NaN)
+    """
+    days = to_day_numbers(dates).astype('datetime64[ns]').reshape(-1, 1)
+    nanos = np.where(np.isnan(minutes), 0, np.round(minutes * 60e9)).astype('int64')
+    values = days + nanos.astype('timedelta64[ns]')
+    return np.where(np.isnan(minutes), np.datetime64('NaT'), values)
+
+
+def solar_position(latitudes, longitudes, times, with_refraction: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sun elevation and azimuth (degrees, azimuth clockwise from north) for every
+    (time, city) pair, as astral's zenith_and_azimuth computes them.
+
+    times are UTC instants (datetime64 or anything numpy converts to it). Solar terms are
+    looked up once per time from the shared ephemeris; returned arrays have shape
+    (len(times), len(cities)).
+    """
+    from .ephemeris import get_ephemeris
+
+    lat = np.clip(np.asarray(latitudes, dtype=float).reshape(1, -1), -89.8, 89.8)
+    lng = np.asarray(longitudes, dtype=float).reshape(1, -1)
+    nanos = np.asarray(times, dtype='datetime64[ns]').reshape(-1).astype('int64')
+    jd = nanos / 86400e9 + UNIX_EPOCH_JD
+    declination, eqtime = get_ephemeris().terms_at(jd)
+
+    minutes = (np.mod(nanos, 86400 * 10**9) / 60e9).reshape(-1, 1)
+    true_solar_time = np.mod(minutes + eqtime.reshape(-1, 1) + 4.0 * lng, 1440.0)
+    hour_angle = true_solar_time / 4.0 - 180.0
+
+    decl = np.radians(declination).reshape(-1, 1)
+    sin_lat, cos_lat = np.sin(np.radians(lat)), np.cos(np.radians(lat))
+    cos_zenith = np.clip(cos_lat * np.cos(decl) * np.cos(np.radians(hour_angle)) + sin_lat * np.sin(decl),
+                         -1.0, 1.0)
+    zenith = np.degrees(np.arccos(cos_zenith))
+
+    az_denominator = cos_lat * np.sin(np.radians(zenith))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        az_cos = np.clip((sin_lat * cos_zenith - np.sin(decl)) / az_denominator, -1.0, 1.0)
+    azimuth = 180.0 - np.degrees(np.arccos(az_cos))
+    azimuth = np.where(hour_angle > 0.0, -azimuth, azimuth)
+    # Sun at the zenith or observer at a pole: azimuth is undefined, use astral's convention
+    azimuth = np.where(np.abs(az_denominator) > 0.001, azimuth, np.where(lat > 0.0, 180.0, 0.0))
+    azimuth = np.mod(azimuth, 360.0)
+
+    if with_refraction:
+        zenith = zenith - refraction_at_zenith(zenith)
+    return 90.0 - zenith, azimuth
@@ -3,51 +3,64 @@ Sunrise and sunset calculation utilities
 """
 import requests
 import time
-from datetime import datetime, date
-from typing import Dict, Optional, Tuple
+from datetime import datetime, date, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, Optional, Tuple, Union
 import logging
-from astral import LocationInfo
-from astral.sun import sun
-from .config import SUNRISE_SUNSET_API, RATE_LIMIT
+import numpy as np
+import pandas as pd
+from .config import SUNRISE_SUNSET_API, SOLAR_POSITION_BLOCK_CELLS
+from .http_client import HttpClient, get_http_client
+from .circuit_breaker import CircuitBreaker, Deadline
+from .solar_engine import (crossing_minutes, hours_above, minutes_to_datetime64, solar_position,
+                           SUNRISE_ELEVATION, TWILIGHT_ELEVATIONS)
+from .timezones import get_zone
+from .result_schema import format_day_length
 
 logger = logging.getLogger(__name__)
 
 class SunriseSunsetCalculator:
-    def __init__(self):
-        self.session = requests.Session()
-        self.last_request_time = 0
+    def __init__(self, breaker: Optional[CircuitBreaker] = None, http_client: Optional[HttpClient] = None):
+        self.http = http_client or get_http_client()
+        self.breaker = breaker or CircuitBreaker('sunrise-sunset-api')
+        self.deadline = Deadline()
     
-    def _rate_limit(self):
-        """Implement rate limiting"""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < (1.0 / RATE_LIMIT):
-            time.sleep((1.0 / RATE_LIMIT) - elapsed)
-        self.last_request_time = time.time()
+    def set_deadline(self, seconds: Optional[float] = None):
+        """Start an overall run deadline; once it passes every remaining call is computed locally"""
+        self.deadline = Deadline(seconds)
     
-    def get_sunrise_sunset_api(self, lat: float, lng: float, target_date: date = None) -> Dict[str, str]:
+    def api_available(self) -> bool:
+        """Whether the API should be tried: run deadline not reached and circuit not open"""
+        return not self.deadline.expired() and self.breaker.allow_request()
+    
+    def get_sunrise_sunset_api(self, lat: float, lng: float, target_date: date = None,
+                               timezone: Optional[str] = None) -> Dict[str, str]:
         """
-        Get sunrise/sunset times using online API
+        Get sunrise/sunset times using online API.
+        With a timezone the API returns the events of the local calendar date.
         """
         if target_date is None:
             target_date = date.today()
         
-        self._rate_limit()
-        
         params = {
             'lat': lat,
             'lng': lng,
             'date': target_date.strftime('%Y-%m-%d'),
             'formatted': 0  # Get times in ISO format
         }
+        if timezone:
+            params['tzid'] = timezone
         
         try:
-            response = self.session.get(SUNRISE_SUNSET_API, params=params)
+            # Throttle first so the breaker only sees the request's own latency
+            self.http.throttle(SUNRISE_SUNSET_API)
+            started = time.monotonic()
+            response = self.http.get(SUNRISE_SUNSET_API, throttle=False, params=params)
             response.raise_for_status()
             data = response.json()
             
             if data['status'] == 'OK':
                 results = data['results']
-                return {
+                record = {
                     'sunrise': results['sunrise'],
                     'sunset': results['sunset'],
                     'solar_noon': results['solar_noon'],
@@ -59,62 +72,168 @@ class SunriseSunsetCalculator:
                     'astronomical_twilight_begin': results['astronomical_twilight_begin'],
                     'astronomical_twilight_end': results['astronomical_twilight_end']
                 }
+                # Only a fully parsed payload counts as a success (and releases a half-open probe)
+                self.breaker.record_success(time.monotonic() - started)
+                return record
             else:
                 logger.warning(f"API returned status: {data['status']}")
+                self.breaker.record_failure()
                 return {}
                 
-        except requests.RequestException as e:
-            logger.error(f"Error calling sunrise-sunset API: {e}")
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            # Malformed payloads are failures too, otherwise a half-open probe is never released
+            logger.error(f"Error calling sunrise-sunset API: {e!r}")
+            self.breaker.record_failure()
             return {}
     
     def get_sunrise_sunset_local(self, lat: float, lng: float, city_name: str = "", 
-                                target_date: date = None) -> Dict[str, str]:
+                                target_date: date = None, timezone: Optional[str] = None) -> Dict[str, str]:
         """
-        Calculate sunrise/sunset times using local astral library
+        Calculate sunrise/sunset, twilight and day length (seconds) locally from the shared
+        per-date ephemeris, with the same keys as the API result ('dawn'/'dusk' are kept
+        as civil twilight aliases). Times are for the city's local solar day and formatted
+        in its timezone when given; events that do not happen (polar day/night) are None.
         """
         if target_date is None:
             target_date = date.today()
         
         try:
-            # Create location info
-            location = LocationInfo(city_name, "", "", lat, lng)
+            crossings = crossing_minutes([lat], [lng], [target_date],
+                                         [SUNRISE_ELEVATION] + list(TWILIGHT_ELEVATIONS.values()))
+            hours = hours_above(crossings)[:, 0, 0]
+            tzinfo = get_zone(timezone) if timezone else dt_timezone.utc
+            midnight = datetime.combine(target_date, datetime.min.time(), dt_timezone.utc)
             
-            # Calculate sun times
-            s = sun(location.observer, date=target_date)
+            def iso(minutes):
+                if np.isnan(minutes):
+                    return None
+                return (midnight + timedelta(minutes=float(minutes))).astimezone(tzinfo).isoformat()
             
-            return {
-                'sunrise': s['sunrise'].isoformat(),
-                'sunset': s['sunset'].isoformat(),
-                'solar_noon': s['noon'].isoformat(),
-                'dawn': s['dawn'].isoformat(),
-                'dusk': s['dusk'].isoformat()
+            rise, sunset = crossings['rise'][:, 0, 0], crossings['set'][:, 0, 0]
+            result = {
+                'sunrise': iso(rise[0]),
+                'sunset': iso(sunset[0]),
+                'solar_noon': iso(crossings['noon'][0, 0]),
+                'day_length': float(hours[0]) * 3600.0,
             }
+            for i, name in enumerate(TWILIGHT_ELEVATIONS, start=1):
+                result[f'{name}_twilight_begin'] = iso(rise[i])
+                result[f'{name}_twilight_end'] = iso(sunset[i])
+            result['dawn'] = result['civil_twilight_begin']
+            result['dusk'] = result['civil_twilight_end']
+            return result
             
         except Exception as e:
             logger.error(f"Error calculating local sunrise/sunset for {city_name}: {e}")
             return {}
     
     def get_sunrise_sunset(self, lat: float, lng: float, city_name: str = "", 
-                          use_api: bool = True, target_date: date = None) -> Dict[str, str]:
+                          use_api: bool = True, target_date: date = None,
+                          timezone: Optional[str] = None) -> Dict[str, str]:
         """
-        Get sunrise/sunset times, trying API first, then falling back to local calculation
+        Get sunrise/sunset times, trying API first, then falling back to local calculation.
+        While the circuit breaker is open or after the run deadline the API is skipped.
+        The result's 'data_source' says which path produced it.
         """
-        if use_api:
-            result = self.get_sunrise_sunset_api(lat, lng, target_date)
+        if use_api and self.api_available():
+            result = self.get_sunrise_sunset_api(lat, lng, target_date, timezone)
             if result:
+                result['data_source'] = 'api'
                 return result
             
             logger.info(f"API failed for {city_name}, falling back to local calculation")
         
-        return self.get_sunrise_sunset_local(lat, lng, city_name, target_date)
+        result = self.get_sunrise_sunset_local(lat, lng, city_name, target_date, timezone)
+        if result:
+            result['data_source'] = 'local'
+        return result
+    
+    def get_sun_crossings_batch(self, latitudes: Iterable[float], longitudes: Iterable[float],
+                                target_date: date = None,
+                                extra_elevations: Iterable[float] = ()) -> pd.DataFrame:
+        """
+        Sunrise/sunset, solar noon and civil/nautical/astronomical twilight for many
+        cities in one vectorized pass, plus the times the sun rises above and sinks below
+        any extra elevation angles (e.g. 10 degrees for solar panels).
+
+        Times are tz-aware UTC timestamps for each city's local solar day; crossings
+        that do not happen (polar day/night) are NaT. day_length is in seconds.
+        """
+        if target_date is None:
+            target_date = date.today()
+        
+        extra_elevations = list(extra_elevations)
+        elevations = [SUNRISE_ELEVATION] + list(TWILIGHT_ELEVATIONS.values()) + extra_elevations
+        crossings = crossing_minutes(latitudes, longitudes, [target_date], elevations)
+        hours = hours_above(crossings)[:, 0, :]
+        
+        def utc(minutes):
+            return pd.to_datetime(minutes_to_datetime64([target_date], minutes)[0]).tz_localize('UTC')
+        
+        result = pd.DataFrame({
+            'sunrise': utc(crossings['rise'][0]),
+            'sunset': utc(crossings['set'][0]),
+            'solar_noon': utc(crossings['noon']),
+            'day_length': hours[0] * 3600.0,
+        })
+        for i, name in enumerate(TWILIGHT_ELEVATIONS, start=1):
+            result[f'{name}_twilight_begin'] = utc(crossings['rise'][i])
+            result[f'{name}_twilight_end'] = utc(crossings['set'][i])
+        for i, elevation in enumerate(extra_elevations, start=1 + len(TWILIGHT_ELEVATIONS)):
+            label = f"{abs(elevation):g}".replace('.', '_')
+            label = f"sun_above_{'minus_' if elevation < 0 else ''}{label}"
+            result[f'{label}_begin'] = utc(crossings['rise'][i])
+            result[f'{label}_end'] = utc(crossings['set'][i])
+            result[f'{label}_hours'] = hours[i]
+        return result
+    
+    def solar_position_batch(self, latitudes: Iterable[float], longitudes: Iterable[float],
+                             timestamps: Iterable, with_refraction: bool = True,
+                             dtype: str = 'float32',
+                             block_cells: int = SOLAR_POSITION_BLOCK_CELLS) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sun elevation and azimuth in degrees for every city at every timestamp.
+
+        timestamps may be naive (taken as UTC) or tz-aware. Returns two (timestamps, cities)
+        matrices of dtype; they are filled block by block so temporary memory stays
+        bounded by block_cells whatever the size of the grid.
+        """
+        times = pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True)).tz_localize(None).to_numpy()
+        latitudes = np.asarray(latitudes, dtype=float).reshape(-1)
+        longitudes = np.asarray(longitudes, dtype=float).reshape(-1)
+        
+        elevation = np.empty((len(times), len(latitudes)), dtype=dtype)
+        azimuth = np.empty_like(elevation)
+        time_step = max(1, min(len(times), block_cells))
+        city_step = max(1, block_cells // time_step)
+        for t0 in range(0, len(times), time_step):
+            for c0 in range(0, len(latitudes), city_step):
+                block = (slice(t0, t0 + time_step), slice(c0, c0 + city_step))
+                elevation[block], azimuth[block] = solar_position(
+                    latitudes[block[1]], longitudes[block[1]], times[block[0]], with_refraction
+                )
+        return elevation, azimuth
     
-    def format_time_for_timezone(self, iso_time: str, timezone_offset: int = 0) -> str:
+    def format_day_length(self, hours: np.ndarray) -> pd.Series:
+        """
+        Format day lengths in hours as H:MM:SS strings without per-row formatting
         """
-        Format ISO time string for display
+        return format_day_length(np.asarray(hours, dtype=float) * 3600.0)
+    
+    def format_time_for_timezone(self, iso_time: str, timezone_offset: Union[int, float, str] = 0) -> str:
+        """
+        Format ISO time string for display in the given timezone.
+        timezone_offset is either an offset from UTC in hours or an IANA zone name.
         """
         try:
             dt = datetime.fromisoformat(iso_time.replace('Z', '+00:00'))
-            return dt.strftime('%H:%M:%S')
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=dt_timezone.utc)
+            if isinstance(timezone_offset, str):
+                tzinfo = get_zone(timezone_offset)
+            else:
+                tzinfo = dt_timezone(timedelta(hours=timezone_offset))
+            return dt.astimezone(tzinfo).strftime('%H:%M:%S')
         except Exception as e:
             logger.error(f"Error formatting time {iso_time}: {e}")
             return iso_time
\ No newline at end of file
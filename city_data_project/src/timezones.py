@@ -0,0 +1,253 @@
+"""
+IANA timezone lookup for cities and vectorized conversion of UTC sun times to local time
+"""
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Countries covered by a single IANA zone
+COUNTRY_TIMEZONES = {
+    "Afghanistan": "Asia/Kabul", "Algeria": "Africa/Algiers", "Angola": "Africa/Luanda",
+    "Argentina": "America/Argentina/Buenos_Aires", "Armenia": "Asia/Yerevan", "Austria": "Europe/Vienna",
+    "Azerbaijan": "Asia/Baku", "Bahrain": "Asia/Bahrain", "Bangladesh": "Asia/Dhaka",
+    "Belarus": "Europe/Minsk", "Belgium": "Europe/Brussels", "Bhutan": "Asia/Thimphu",
+    "Bolivia": "America/La_Paz", "Brunei": "Asia/Brunei", "Bulgaria": "Europe/Sofia",
+    "Cambodia": "Asia/Phnom_Penh", "Chile": "America/Santiago", "China": "Asia/Shanghai",
+    "Colombia": "America/Bogota", "Croatia": "Europe/Zagreb", "Cuba": "America/Havana",
+    "Czech Republic": "Europe/Prague", "Denmark": "Europe/Copenhagen", "Ecuador": "America/Guayaquil",
+    "Egypt": "Africa/Cairo", "Estonia": "Europe/Tallinn", "Ethiopia": "Africa/Addis_Ababa",
+    "Finland": "Europe/Helsinki", "France": "Europe/Paris", "Georgia": "Asia/Tbilisi",
+    "Germany": "Europe/Berlin", "Ghana": "Africa/Accra", "Greece": "Europe/Athens",
+    "Hong Kong": "Asia/Hong_Kong", "Hungary": "Europe/Budapest", "Iceland": "Atlantic/Reykjavik",
+    "India": "Asia/Kolkata", "Iran": "Asia/Tehran", "Iraq": "Asia/Baghdad", "Ireland": "Europe/Dublin",
+    "Israel": "Asia/Jerusalem", "Italy": "Europe/Rome", "Japan": "Asia/Tokyo", "Jordan": "Asia/Amman",
+    "Kenya": "Africa/Nairobi", "Kuwait": "Asia/Kuwait", "Kyrgyzstan": "Asia/Bishkek",
+    "Laos": "Asia/Vientiane", "Latvia": "Europe/Riga", "Lebanon": "Asia/Beirut",
+    "Lithuania": "Europe/Vilnius", "Macau": "Asia/Macau", "Malaysia": "Asia/Kuala_Lumpur",
+    "Maldives": "Indian/Maldives", "Morocco": "Africa/Casablanca", "Myanmar": "Asia/Yangon",
+    "Nepal": "Asia/Kathmandu", "Netherlands": "Europe/Amsterdam", "New Zealand": "Pacific/Auckland",
+    "Nigeria": "Africa/Lagos", "North Korea": "Asia/Pyongyang", "Norway": "Europe/Oslo",
+    "Oman": "Asia/Muscat", "Pakistan": "Asia/Karachi", "Peru": "America/Lima",
+    "Philippines": "Asia/Manila", "Poland": "Europe/Warsaw", "Portugal": "Europe/Lisbon",
+    "Qatar": "Asia/Qatar", "Romania": "Europe/Bucharest", "Saudi Arabia": "Asia/Riyadh",
+    "Senegal": "Africa/Dakar", "Serbia": "Europe/Belgrade", "Singapore": "Asia/Singapore",
+    "South Africa": "Africa/Johannesburg", "South Korea": "Asia/Seoul", "Spain": "Europe/Madrid",
+    "Sri Lanka": "Asia/Colombo", "Sweden": "Europe/Stockholm", "Switzerland": "Europe/Zurich",
+    "Syria": "Asia/Damascus", "Taiwan": "Asia/Taipei", "Tajikistan": "Asia/Dushanbe",
+    "Tanzania": "Africa/Dar_es_Salaam", "Thailand": "Asia/Bangkok", "Tunisia": "Africa/Tunis",
+    "Turkey": "Europe/Istanbul", "Turkmenistan": "Asia/Ashgabat", "UAE": "Asia/Dubai",
+    "Ukraine": "Europe/Kiev", "United Kingdom": "Europe/London", "Uruguay": "America/Montevideo",
+    "Uzbekistan": "Asia/Tashkent", "Venezuela": "America/Caracas", "Vietnam": "Asia/Ho_Chi_Minh",
+    "Yemen": "Asia/Aden",
+}
+
+# Countries spanning several zones: (lat_min, lat_max, lng_min, lng_max, zone), first match wins.
+# These are coarse boxes that are right for the cities we track; a 'timezone' column in the
+# dataset (e.g. from GeoNames) always takes precedence.
+_RUSSIA_ZONES = [
+    (54.0, 55.5, 19.0, 23.0, "Europe/Kaliningrad"),
+    (-90.0, 90.0, -180.0, 50.0, "Europe/Moscow"),
+    (-90.0, 90.0, 50.0, 55.5, "Europe/Samara"),
+    (58.0, 90.0, 55.5, 82.0, "Asia/Yekaterinburg"),
+    (-90.0, 90.0, 55.5, 70.0, "Asia/Yekaterinburg"),
+    (-90.0, 90.0, 70.0, 79.0, "Asia/Omsk"),
+    (-90.0, 58.0, 79.0, 87.5, "Asia/Novosibirsk"),
+    (-90.0, 90.0, 79.0, 100.0, "Asia/Krasnoyarsk"),
+    (-90.0, 90.0, 100.0, 112.5, "Asia/Irkutsk"),
+    (-90.0, 55.0, 112.5, 120.0, "Asia/Chita"),
+    (-90.0, 55.5, 130.0, 140.0, "Asia/Vladivostok"),
+    (45.0, 55.0, 141.0, 146.0, "Asia/Sakhalin"),
+    (-90.0, 90.0, 112.5, 140.0, "Asia/Yakutsk"),
+    (-90.0, 90.0, 140.0, 156.0, "Asia/Magadan"),
+    (-90.0, 90.0, 156.0, 180.0, "Asia/Kamchatka"),
+]
+
+REGIONAL_TIMEZONES = {
+    "United States": [
+        (18.0, 23.0, -161.0, -154.0, "Pacific/Honolulu"),
+        (51.0, 72.0, -180.0, -129.9, "America/Anchorage"),
+        (31.3, 37.0, -114.8, -109.05, "America/Phoenix"),
+        (42.0, 45.5, -117.2, -111.0, "America/Boise"),
+        (-90.0, 90.0, -180.0, -114.05, "America/Los_Angeles"),
+        (-90.0, 90.0, -114.05, -102.0, "America/Denver"),
+        (37.8, 41.8, -88.1, -84.8, "America/Indiana/Indianapolis"),
+        (41.7, 48.3, -90.4, -82.4, "America/Detroit"),
+        (-90.0, 90.0, -102.0, -86.0, "America/Chicago"),
+        (-90.0, 90.0, -86.0, 180.0, "America/New_York"),
+    ],
+    "Canada": [
+        (60.0, 90.0, -141.0, -124.0, "America/Whitehorse"),
+        (-90.0, 60.0, -141.0, -120.0, "America/Vancouver"),
+        (-90.0, 90.0, -124.0, -110.0, "America/Edmonton"),
+        (-90.0, 60.0, -110.0, -101.5, "America/Regina"),
+        (-90.0, 90.0, -110.0, -90.0, "America/Winnipeg"),
+        (60.0, 90.0, -90.0, -60.0, "America/Iqaluit"),
+        (46.5, 52.0, -59.8, -52.0, "America/St_Johns"),
+        (43.0, 48.1, -69.0, -59.8, "America/Halifax"),
+        (-90.0, 90.0, -90.0, 180.0, "America/Toronto"),
+    ],
+    "Mexico": [
+        (28.0, 33.0, -118.0, -114.7, "America/Tijuana"),
+        (31.3, 31.8, -107.0, -106.0, "America/Ciudad_Juarez"),
+        (26.0, 32.5, -115.0, -108.5, "America/Hermosillo"),
+        (-90.0, 26.5, -118.0, -104.5, "America/Mazatlan"),
+        (25.5, 31.8, -109.0, -103.3, "America/Chihuahua"),
+        (17.8, 22.0, -89.3, -86.0, "America/Cancun"),
+        (-90.0, 90.0, -180.0, 180.0, "America/Mexico_City"),
+    ],
+    "Brazil": [
+        (-90.0, 90.0, -75.0, -67.5, "America/Rio_Branco"),
+        (-24.0, 6.0, -67.5, -54.0, "America/Manaus"),
+        (-90.0, 90.0, -180.0, 180.0, "America/Sao_Paulo"),
+    ],
+    "Australia": [
+        (-90.0, 0.0, 110.0, 129.0, "Australia/Perth"),
+        (-26.0, 0.0, 129.0, 138.0, "Australia/Darwin"),
+        (-90.0, 0.0, 129.0, 141.0, "Australia/Adelaide"),
+        (-28.2, 0.0, 138.0, 154.0, "Australia/Brisbane"),
+        (-45.0, -39.2, 143.0, 149.0, "Australia/Hobart"),
+        (-39.2, -35.9, 141.0, 150.0, "Australia/Melbourne"),
+        (-90.0, 90.0, -180.0, 180.0, "Australia/Sydney"),
+    ],
+    "Indonesia": [
+        (-90.0, 90.0, -180.0, 115.0, "Asia/Jakarta"),
+        (-90.0, 90.0, 126.5, 180.0, "Asia/Jayapura"),
+        (-90.0, 90.0, -180.0, 180.0, "Asia/Makassar"),
+    ],
+    "Kazakhstan": [
+        (-90.0, 90.0, -180.0, 55.0, "Asia/Aqtau"),
+        (-90.0, 90.0, -180.0, 180.0, "Asia/Almaty"),
+    ],
+    "Mongolia": [
+        (-90.0, 90.0, -180.0, 100.0, "Asia/Hovd"),
+        (-90.0, 90.0, -180.0, 180.0, "Asia/Ulaanbaatar"),
+    ],
+    "DR Congo": [
+        (-90.0, 90.0, -180.0, 21.0, "Africa/Kinshasa"),
+        (-90.0, 90.0, -180.0, 180.0, "Africa/Lubumbashi"),
+    ],
+    "Russia": _RUSSIA_ZONES,
+    "Russia (Siberia)": _RUSSIA_ZONES,
+    "Russia (Far East)": _RUSSIA_ZONES,
+}
+
+
+@lru_cache(maxsize=None)
+def get_zone(name: str) -> ZoneInfo:
+    """
+    Cached ZoneInfo lookup so each zone file is parsed once per process
+    """
+    return ZoneInfo(name)
+
+
+def solar_offset_zone(lng: float) -> str:
+    """
+    Fixed-offset Etc/GMT zone nearest to the longitude (Etc/GMT signs are inverted)
+    """
+    offset = int(round(lng / 15.0))
+    return "Etc/GMT" if offset == 0 else f"Etc/GMT{-offset:+d}"
+
+
+def resolve_timezone(country: Optional[str], lat: float, lng: float) -> str:
+    """
+    Resolve the IANA timezone for a single location
+    """
+    if country in COUNTRY_TIMEZONES:
+        return COUNTRY_TIMEZONES[country]
+    for lat_min, lat_max, lng_min, lng_max, zone in REGIONAL_TIMEZONES.get(country, ()):
+        if lat_min <= lat < lat_max and lng_min <= lng < lng_max:
+            return zone
+    return solar_offset_zone(lng)
+
+
+def attach_timezones(df: pd.DataFrame, country_column: Optional[str] = None) -> pd.DataFrame:
+    """
+    Add a 'timezone' column, keeping any zones already present in the dataset.
+    Countries come from 'country', or 'country_name' as loaded from city CSV files.
+    """
+    if len(df) == 0:
+        df['timezone'] = pd.Series(dtype=object)
+        return df
+
+    if 'timezone' in df.columns:
+        zones = df['timezone'].astype(object).where(df['timezone'].notna(), None)
+    else:
+        zones = pd.Series(None, index=df.index, dtype=object)
+
+    if country_column is None:
+        country_column = 'country' if 'country' in df.columns else 'country_name'
+    if country_column in df.columns:
+        countries = df[country_column]
+    else:
+        countries = pd.Series(None, index=df.index)
+        if zones.isna().any():
+            logger.warning(f"No '{country_column}' column; using fixed solar-offset zones without DST")
+    missing = zones.isna()
+    zones = zones.where(~missing, countries.map(COUNTRY_TIMEZONES))
+
+    lat = df['latitude'].to_numpy(dtype=float)
+    lng = df['longitude'].to_numpy(dtype=float)
+    for country, rules in REGIONAL_TIMEZONES.items():
+        mask = (zones.isna() & (countries == country)).to_numpy()
+        if not mask.any():
+            continue
+        hits = np.array([(lat[mask] >= r[0]) & (lat[mask] < r[1]) & (lng[mask] >= r[2]) & (lng[mask] < r[3])
+                         for r in rules])
+        names = np.array([r[4] for r in rules], dtype=object)
+        zones.iloc[np.flatnonzero(mask)] = np.where(hits.any(axis=0), names[hits.argmax(axis=0)], None)
+
+    still_missing = zones.isna().to_numpy()
+    if still_missing.any():
+        zones.iloc[np.flatnonzero(still_missing)] = [solar_offset_zone(x) for x in lng[still_missing]]
+
+    df['timezone'] = zones
+    return df
+
+
+def localize_times(df: pd.DataFrame, columns: Iterable[str], fmt: str = '%Y-%m-%dT%H:%M:%S%z',
+                   tz_column: str = 'timezone') -> pd.DataFrame:
+    """
+    Convert UTC timestamp columns to local time, one vectorized tz_convert per timezone group.
+
+    Values that are not timestamps (e.g. None for polar day/night) are left as they are.
+    With fmt=None the local values are kept as tz-aware Timestamps instead of strings.
+    """
+    columns = [c for c in columns if c in df.columns]
+    if len(df) == 0 or not columns:
+        return df
+    if tz_column not in df.columns:
+        df = attach_timezones(df)
+
+    groups = df.groupby(tz_column, sort=False).indices
+    for col in columns:
+        utc = pd.to_datetime(df[col], utc=True, errors='coerce', format='mixed')
+        valid = utc.notna().to_numpy()
+        out = df[col].astype(object).to_numpy(copy=True)
+        for zone, positions in groups.items():
+            positions = positions[valid[positions]]
+            if len(positions) == 0:
+                continue
+            local = utc.iloc[positions].dt.tz_convert(get_zone(zone))
+            out[positions] = (local.dt.strftime(fmt) if fmt else local).to_numpy(dtype=object)
+        df[col] = out
+    return df
+
+
+def utc_offset_minutes(zones: Iterable[str], dates) -> np.ndarray:
+    """
+    UTC offset in minutes at local noon for each (date, zone) pair, shape (len(dates), len(zones)).
+    Offsets are computed once per distinct zone, so DST is honoured without per-row work.
+    """
+    zones = np.asarray(list(zones), dtype=object)
+    local_noon = pd.DatetimeIndex(np.asarray(dates, dtype='datetime64[D]')) + pd.Timedelta(hours=12)
+    offsets = np.zeros((len(local_noon), len(zones)))
+    for zone in pd.unique(zones):
+        aware = local_noon.tz_localize(get_zone(zone), ambiguous='NaT', nonexistent='shift_forward')
+        utc = aware.tz_convert('UTC').tz_localize(None)
+        offsets[:, zones == zone] = ((local_noon - utc) / pd.Timedelta(minutes=1)).to_numpy().reshape(-1, 1)
+    return offsets
@@ -3,18 +3,22 @@
 Standalone script to find top 20 cities with 200k+ population 
 ranked by most daylight on Summer Solstice 2024 (June 20)
 """
+import argparse
 import pandas as pd
 import os
 from datetime import date, datetime
-from astral import LocationInfo
-from astral.sun import sun
 import logging
+from src.city_filter import CityFilter
+from src.timezones import attach_timezones
+from src.result_schema import format_for_display
+from src.region_summary import daylight_durations
+from src.ranking_cache import RankingCache, dataset_version
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
-def get_cities_data():
+def get_cities_data(city_filter=None):
     """Load comprehensive city data with 200k+ population"""
     cities = [
         # Major world cities with populations over 200k, focusing on northern cities for solstice
@@ -76,39 +80,33 @@ def get_cities_data():
         {"name": "Los Angeles", "latitude": 34.0522, "longitude": -118.2437, "population": 12448000, "country": "United States"},
     ]
     
-    # Filter by minimum population of 200k
-    filtered_cities = [city for city in cities if city['population'] >= 2000]
-    return pd.DataFrame(filtered_cities)
+    # Filter by minimum population (and any other filters) before building the frame
+    city_filter = (city_filter or CityFilter()).with_min_population(2000)
+    return pd.DataFrame(city_filter.select_records(cities))
 
-def calculate_daylight_duration(lat, lng, target_date, city_name=""):
-    """Calculate daylight duration for a given location and date"""
-    try:
-        location = LocationInfo(city_name, "", "", lat, lng)
-        s = sun(location.observer, date=target_date)
-        
-        sunrise = s['sunrise']
-        sunset = s['sunset']
-        
-        # Calculate daylight duration in hours
-        daylight_duration = (sunset - sunrise).total_seconds() / 3600.0
-        
-        return {
-            'sunrise': sunrise.strftime('%H:%M:%S'),
-            'sunset': sunset.strftime('%H:%M:%S'),
-            'daylight_hours': daylight_duration,
-            'day_length': f"{int(daylight_duration)}:{int((daylight_duration % 1) * 60):02d}:{int(((daylight_duration % 1) * 60 % 1) * 60):02d}"
-        }
-    except Exception as e:
-        logger.warning(f"Error calculating daylight for {city_name}: {e}")
-        return {
-            'sunrise': None,
-            'sunset': None,
-            'daylight_hours': 0.0,
-            'day_length': "0:00:00"
-        }
+# Columns of the results table
+OUTPUT_COLUMNS = ['name', 'country', 'latitude', 'longitude', 'population', 'timezone',
+                  'sunrise', 'sunset', 'daylight_hours', 'day_length']
+
+def rank_cities(cities_df, solstice_date):
+    """Daylight for every city, ranked by daylight hours and then population"""
+    # One vectorized pass: UTC sunrise/sunset, day length in seconds
+    logger.info("Calculating daylight duration for each city...")
+    results_df = daylight_durations(cities_df, solstice_date)[OUTPUT_COLUMNS]
+    
+    # Sort by daylight hours (descending) and then by population for ties
+    results_df = results_df.sort_values(['daylight_hours', 'population'], ascending=[False, False])
+    return results_df
 
 def main():
     """Main analysis function"""
+    parser = argparse.ArgumentParser(description="Cities ranked by daylight on summer solstice 2024")
+    parser.add_argument('--min-population', type=int, default=0,
+                        help='Only include cities with at least this population (filtered before the frame is built)')
+    parser.add_argument('--countries', type=str,
+                        help='Comma-separated country names to include')
+    args = parser.parse_args()
+    
     # Summer solstice 2024 date
     solstice_date = date(2024, 6, 20)
     
@@ -117,55 +115,33 @@ def main():
     logger.info("Minimum population: 200,000")
     
     # Load city data
-    cities_df = get_cities_data()
+    countries = [c.strip() for c in args.countries.split(',')] if args.countries else None
+    city_filter = CityFilter(args.min_population, countries)
+    cities_df = get_cities_data(city_filter)
     logger.info(f"Loaded {len(cities_df)} cities with 200k+ population")
     
-    # Calculate daylight for each city
-    logger.info("Calculating daylight duration for each city...")
-    
-    daylight_data = []
-    for idx, row in cities_df.iterrows():
-        city_name = row['name']
-        country = row['country']
-        lat = row['latitude']
-        lng = row['longitude']
-        population = row['population']
-        
-        logger.info(f"Processing {city_name}, {country} ({idx + 1}/{len(cities_df)})")
-        
-        daylight_info = calculate_daylight_duration(lat, lng, solstice_date, city_name)
-        
-        daylight_data.append({
-            'name': city_name,
-            'country': country,
-            'latitude': lat,
-            'longitude': lng,
-            'population': population,
-            'sunrise': daylight_info['sunrise'],
-            'sunset': daylight_info['sunset'],
-            'daylight_hours': daylight_info['daylight_hours'],
-            'day_length': daylight_info['day_length']
-        })
-    
-    # Create results dataframe
-    results_df = pd.DataFrame(daylight_data)
-    
-    # Sort by daylight hours (descending) and then by population for ties
-    results_df = results_df.sort_values(['daylight_hours', 'population'], ascending=[False, False])
+    # Attach IANA timezones so each city is computed for its local date
+    cities_df = attach_timezones(cities_df)
     
-    # Get top 20 cities
-    top_20 = results_df.head(20)
+    # Serve a repeat of the same query from the ranking cache, else compute and rank every city
+    cache = RankingCache()
+    cache_key = RankingCache.key(solstice_date, f"summer_solstice_analysis;{city_filter.cache_key()}", False,
+                                 dataset_version(cities_df))
+    top_20 = cache.get(cache_key, 20)
+    if top_20 is None:
+        top_20 = rank_cities(cities_df, solstice_date).head(20)
+        cache.put(cache_key, 20, top_20)
     
-    # Save to CSV
+    # Save to CSV as local clock times and H:MM:SS day lengths
     output_file = f"summer_solstice_2024_top_20_cities_by_daylight.csv"
-    top_20.to_csv(output_file, index=False)
+    format_for_display(top_20).to_csv(output_file, index=False)
     
     # Display results
     print("\n" + "="*120)
     print("TOP 20 CITIES WITH MOST DAYLIGHT ON SUMMER SOLSTICE 2024 (June 20)")
     print("="*120)
     
-    display_df = top_20[['name', 'country', 'population', 'latitude', 'daylight_hours', 'sunrise', 'sunset']].copy()
+    display_df = format_for_display(top_20, '%H:%M:%S')[['name', 'country', 'population', 'latitude', 'daylight_hours', 'sunrise', 'sunset']]
     display_df['population'] = display_df['population'].apply(lambda x: f"{x:,}")
     display_df['daylight_hours'] = display_df['daylight_hours'].apply(lambda x: f"{x:.2f}h")
     display_df['latitude'] = display_df['latitude'].apply(lambda x: f"{x:.2f}°N")
@@ -177,8 +153,8 @@ def main():
     
     print(f"\n🌞 WINNER: {top_20.iloc[0]['name']}, {top_20.iloc[0]['country']}")
     print(f"   Daylight: {top_20.iloc[0]['daylight_hours']:.2f} hours")
-    print(f"   Sunrise: {top_20.iloc[0]['sunrise']}")
-    print(f"   Sunset: {top_20.iloc[0]['sunset']}")
+    print(f"   Sunrise: {display_df.iloc[0]['sunrise']}")
+    print(f"   Sunset: {display_df.iloc[0]['sunset']}")
     print(f"   Population: {top_20.iloc[0]['population']:,}")
     print(f"   Latitude: {top_20.iloc[0]['latitude']:.2f}°N")
     